@@ -1,8 +1,10 @@
 from abc import ABC, abstractmethod
-from youtube import Youtube
+from collections import OrderedDict
+from youtube import Youtube, extract_video_id
 from weburl import WebURL
 from dotenv import load_dotenv
 import os
+import threading
 
 load_dotenv()
 
@@ -16,13 +18,44 @@ class Transcript(ABC):
         pass
 
 class TranscriptFactory:
+    # Source objects keyed by canonical video id or URL, so building the same source twice is free
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+    max_cached = 256
+
     @staticmethod
-    def create_transcript(url: str) -> Transcript:
+    def source_key(url: str):
         if "youtube.com" in url or "youtu.be" in url:
+            return ("youtube", extract_video_id(url))
+        return ("web", url.rstrip("/"))
+
+    @staticmethod
+    def create_transcript(url: str, use_cache: bool = True) -> Transcript:
+        key = TranscriptFactory.source_key(url)
+        if use_cache:
+            with TranscriptFactory._cache_lock:
+                if key in TranscriptFactory._cache:
+                    TranscriptFactory._cache.move_to_end(key)
+                    return TranscriptFactory._cache[key]
+
+        if key[0] == "youtube":
             api_key = os.getenv("YOUTUBE_API_KEY")
-            return Youtube(api_key, url)
+            transcript = Youtube(api_key, url)
         else:
-            return WebURL(url)
+            transcript = WebURL(url)
+
+        # Sources whose metadata could not be fetched are not cached, so the next call retries
+        if use_cache and transcript.metadata:
+            with TranscriptFactory._cache_lock:
+                TranscriptFactory._cache[key] = transcript
+                while len(TranscriptFactory._cache) > TranscriptFactory.max_cached:
+                    TranscriptFactory._cache.popitem(last=False)
+        return transcript
+
+    @staticmethod
+    def clear_cache():
+        with TranscriptFactory._cache_lock:
+            TranscriptFactory._cache.clear()
 
 def main():
     url = "https://www.youtube.com/watch?v=lh5Wj6QhbbU"
@@ -0,0 +1,359 @@
+"""
+Offline end-to-end benchmark: synthetic transcripts, deterministic fake embeddings and the stub LLM.
+
+    python benchmark.py --videos 20 --words 20000 --output results.json
+    python benchmark.py --save-baseline baseline.json
+    python benchmark.py --baseline baseline.json --tolerance 0.2   # exits 1 on a regression
+"""
+import io
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import contextlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_VIDEOS = 20
+DEFAULT_WORDS_PER_VIDEO = 20_000
+DEFAULT_DIM = 384
+DEFAULT_QUERIES = 200
+DEFAULT_K = 4
+DEFAULT_TOLERANCE = 0.2
+
+VOCABULARY_SIZE = 5000
+WORDS_PER_SEGMENT = 12
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings: every word is hashed to a signed dimension and the
+    vector is L2-normalised. Texts sharing words get close vectors, so search results are meaningful.
+    """
+
+    def __init__(self, dim: int = DEFAULT_DIM):
+        self.dim = dim
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            code = zlib.crc32(word.encode())
+            vector[code % self.dim] += 1.0 if code & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts):
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text).tolist()
+
+class RecordingMilvus:
+    """
+    Stands in for MilvusVectorDB on the ingest paths; counts the rows it is asked to insert.
+    """
+
+    def __init__(self):
+        self.rows = {}
+
+    def insert(self, collection_name, entities, flush=True):
+        self.rows[collection_name] = self.rows.get(collection_name, 0) + len(entities["id"])
+
+    def flush(self, collection_name):
+        pass
+
+def percentiles(samples) -> dict:
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def make_vocabulary(rng: random.Random):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(VOCABULARY_SIZE)]
+
+def generate_corpus(transcript_dir: str, videos: int, words_per_video: int, seed: int = 0):
+    """
+    Writes <id>.txt transcripts (with .seg time indexes) and META_<id>.json files the way youtube.py does.
+    Word frequencies are Zipf-like, so a few words are common and most are rare. Returns the vocabulary.
+    """
+    from segments import SegmentIndex
+
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    os.makedirs(transcript_dir, exist_ok=True)
+    for video in range(videos):
+        video_id = f"bench{video:06d}"
+        words = rng.choices(vocabulary, weights, k=words_per_video)
+        pieces = [{"text": " ".join(words[i:i + WORDS_PER_SEGMENT]), "start": i / 2.5, "duration": WORDS_PER_SEGMENT / 2.5}
+                  for i in range(0, len(words), WORDS_PER_SEGMENT)]
+        text, segments = SegmentIndex.from_pieces(pieces)
+        transcript_path = os.path.join(transcript_dir, f"{video_id}.txt")
+        with open(transcript_path, "w", encoding="utf-8") as file:
+            file.write(text)
+        segments.save(os.path.splitext(transcript_path)[0] + ".seg")
+
+        metadata = {
+            "id": video_id,
+            "source_type": "youtube",
+            "title": f"Benchmark video {video}",
+            "description": " ".join(rng.choices(vocabulary, weights, k=300)),
+            "publish_date": "2024-01-01T00:00:00Z",
+            "view_count": rng.randint(0, 10**6),
+            "like_count": rng.randint(0, 10**4),
+            "dislike_count": 0,
+            "comment_count": rng.randint(0, 10**3),
+        }
+        with open(os.path.join(transcript_dir, f"META_{video_id}.json"), "w") as file:
+            json.dump(metadata, file)
+    return vocabulary
+
+def make_queries(vocabulary, count: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(vocabulary[:500], k=rng.randint(3, 8))) for _ in range(count)]
+
+def list_corpus(transcript_dir: str):
+    files = []
+    for filename in sorted(os.listdir(transcript_dir)):
+        if filename.endswith(".txt"):
+            video_id = filename[:-len(".txt")]
+            files.append((video_id, os.path.join(transcript_dir, filename),
+                          os.path.join(transcript_dir, f"META_{video_id}.json")))
+    return files
+
+def bench_chunking(files) -> dict:
+    from chunker import iter_file_documents
+
+    start = time.perf_counter()
+    chunks = sum(1 for video_id, transcript_path, _ in files
+                 for _ in iter_file_documents(transcript_path, {"id": video_id}))
+    elapsed = time.perf_counter() - start
+    total_bytes = sum(os.path.getsize(transcript_path) for _, transcript_path, _ in files)
+    return {"chunks": chunks, "chunks_per_sec": chunks / elapsed, "bytes_per_sec": total_bytes / elapsed}
+
+def bench_ingest(files, embeddings, dim: int) -> dict:
+    from metadata import process_metadata_file
+    from transcript import process_transcript_file
+    from utils import read_metadata
+
+    from vectordb.writer import BufferedWriter
+
+    milvus_db = RecordingMilvus()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), BufferedWriter(milvus_db) as writer:
+        for _, transcript_path, metadata_path in files:
+            process_metadata_file(metadata_path, embeddings, dim, writer, collection_name="transcript_metadata")
+            process_transcript_file(transcript_path, read_metadata(metadata_path), embeddings, dim, writer,
+                                    collection_name="transcript_collection")
+    elapsed = time.perf_counter() - start
+    chunks = sum(milvus_db.rows.values())
+    total_bytes = sum(os.path.getsize(path) for _, transcript_path, metadata_path in files
+                      for path in (transcript_path, metadata_path))
+    return {"chunks": chunks, "chunks_per_sec": chunks / elapsed, "bytes_per_sec": total_bytes / elapsed}
+
+def bench_faiss(files, embeddings, dim: int, queries, k: int, root: str) -> dict:
+    from chunker import split_file_into_documents
+    from vectordb.faiss import FAISSVectorDB
+
+    db = FAISSVectorDB(embeddings, root=root, expected_dim=dim)
+    documents = [doc for video_id, transcript_path, _ in files
+                 for doc in split_file_into_documents(transcript_path, {"id": video_id, "transcript_path": transcript_path})]
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.create_collection("bench", {"dim": dim, "index_type": "auto", "expected_size": len(documents)})
+        db.insert("bench", documents)
+        db.save("bench")
+    build_seconds = time.perf_counter() - start
+
+    db = FAISSVectorDB(embeddings, root=root, expected_dim=dim)
+    db.load("bench")
+    latencies = []
+    hits = []
+    for query in queries:
+        start = time.perf_counter()
+        results = db.similarity_search_with_score("bench", query, k)
+        latencies.append(time.perf_counter() - start)
+        hits.append(results)
+    return {
+        "vectors": len(documents),
+        "index_type": db.get_collection("bench").index_type,
+        "build_seconds": build_seconds,
+        "search": percentiles(latencies),
+        "hits": hits,
+    }
+
+def bench_parent_retriever(hits) -> dict:
+    from client import parent_retriever
+    from transcript_store import TranscriptStore
+
+    store = TranscriptStore()
+    latencies = []
+    for results in hits:
+        search_results = [dict(doc.metadata) for doc, _ in results]
+        start = time.perf_counter()
+        parent_retriever(search_results, store)
+        latencies.append(time.perf_counter() - start)
+    store.close()
+    return percentiles(latencies)
+
+def bench_query(files, embeddings, queries, k: int, workdir: str) -> dict:
+    import langchainhelper
+    from retrieval_cache import RetrievalCache
+
+    langchainhelper.set_embeddings(embeddings)
+    llm = langchainhelper.get_llm("stub")
+    _, transcript_path, _ = files[0]
+    cwd = os.getcwd()
+    os.chdir(workdir)  # create_vector_db_from_transcript_file writes under ./vdb
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = langchainhelper.create_vector_db_from_transcript_file(transcript_path, "bench_query")
+            # One untimed query so lazy imports and prompt setup are not counted as cold latency
+            langchainhelper.get_response_from_query(db, "warm up", k, cache=RetrievalCache(), llm=llm)
+            cache = RetrievalCache()
+            results = {}
+            for phase in ("cold", "warm"):
+                latencies = []
+                for query in queries:
+                    start = time.perf_counter()
+                    langchainhelper.get_response_from_query(db, query, k, cache=cache, llm=llm)
+                    latencies.append(time.perf_counter() - start)
+                results[phase] = percentiles(latencies)
+    finally:
+        os.chdir(cwd)
+    return results
+
+def run_benchmarks(videos: int = DEFAULT_VIDEOS, words_per_video: int = DEFAULT_WORDS_PER_VIDEO, dim: int = DEFAULT_DIM,
+                   num_queries: int = DEFAULT_QUERIES, k: int = DEFAULT_K, seed: int = 0, workdir: str = None) -> dict:
+    """
+    Runs every stage on a fresh synthetic corpus and returns {"config", "environment", "metrics"}.
+    metrics is a flat dict of stage.metric -> number so runs can be compared key by key.
+    """
+    owns_workdir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="ytbench-")
+    transcript_dir = os.path.join(workdir, "transcripts")
+    embeddings = FakeEmbeddings(dim)
+    metrics = {}
+    try:
+        vocabulary = generate_corpus(transcript_dir, videos, words_per_video, seed)
+        queries = make_queries(vocabulary, num_queries, seed + 1)
+        files = list_corpus(transcript_dir)
+
+        for name, value in bench_chunking(files).items():
+            metrics[f"chunking.{name}"] = value
+        for name, value in bench_ingest(files, embeddings, dim).items():
+            metrics[f"ingest.{name}"] = value
+        metrics["ingest.peak_rss_bytes"] = peak_rss_bytes()
+
+        faiss_results = bench_faiss(files, embeddings, dim, queries, k, os.path.join(workdir, "faiss"))
+        metrics["faiss.vectors"] = faiss_results["vectors"]
+        metrics["faiss.build_seconds"] = faiss_results["build_seconds"]
+        for name, value in faiss_results["search"].items():
+            metrics[f"faiss.search_{name}"] = value
+        for name, value in bench_parent_retriever(faiss_results["hits"]).items():
+            metrics[f"parent_retriever.{name}"] = value
+
+        for phase, values in bench_query(files, embeddings, queries, k, workdir).items():
+            for name, value in values.items():
+                metrics[f"query.{phase}_{name}"] = value
+        metrics["peak_rss_bytes"] = peak_rss_bytes()
+        index_type = faiss_results["index_type"]
+    finally:
+        if owns_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "config": {"videos": videos, "words_per_video": words_per_video, "dim": dim,
+                   "queries": num_queries, "k": k, "seed": seed, "faiss_index_type": index_type},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count()},
+        "metrics": metrics,
+    }
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_sec")
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE):
+    """
+    Returns a list of regressions: metrics that are more than tolerance (a fraction) worse than the baseline.
+    Throughput metrics (*_per_sec) must not drop; latency, time and memory metrics must not grow.
+    """
+    regressions = []
+    for metric, old in baseline.get("metrics", {}).items():
+        new = results["metrics"].get(metric)
+        if new is None or not old or metric.endswith(".vectors") or metric.endswith(".chunks"):
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better(metric) else change
+        if worse > tolerance:
+            regressions.append({"metric": metric, "baseline": old, "current": new, "change": change})
+    if baseline.get("config") and baseline["config"] != results["config"]:
+        print("Warning: baseline was recorded with a different config; comparisons may not be meaningful.")
+    return regressions
+
+def format_results(results: dict) -> str:
+    lines = []
+    for metric, value in results["metrics"].items():
+        if metric.endswith("_bytes"):
+            lines.append(f"{metric:40s} {value / (1024 * 1024):12.1f} MiB")
+        elif isinstance(value, float):
+            lines.append(f"{metric:40s} {value:12.3f}")
+        else:
+            lines.append(f"{metric:40s} {value:12}")
+    return "\n".join(lines)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark for ingest, chunking, embedding and retrieval.")
+    parser.add_argument("--videos", type=int, default=DEFAULT_VIDEOS, help="Number of synthetic transcripts")
+    parser.add_argument("--words", type=int, default=DEFAULT_WORDS_PER_VIDEO, help="Words per transcript")
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM, help="Fake embedding dimension")
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES, help="Number of search/query samples")
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help="Documents retrieved per query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results JSON to this file (default: stdout summary only)")
+    parser.add_argument("--save-baseline", help="Write results JSON to this file for later comparison")
+    parser.add_argument("--baseline", help="Compare against this results JSON and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed fractional slowdown before a metric counts as a regression")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = run_benchmarks(args.videos, args.words, args.dim, args.queries, args.k, args.seed)
+    print(format_results(results))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as file:
+                json.dump(results, file, indent=2)
+            print(f"Results written to: {path}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression['metric']}: {regression['baseline']:.3f} -> "
+                  f"{regression['current']:.3f} ({regression['change']:+.1%})")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import threading
+
+class MetadataCatalog:
+    """
+    In-memory index of the META_*.json files in a transcripts directory, keyed by video id.
+
+    Files are parsed once and re-read only when their mtime changes. Lookups are O(1);
+    an expired refresh_interval triggers an incremental refresh, which scans transcript_dir and
+    adds the META files listed in the ingest manifest (reloaded when an ingest rewrites it), so
+    files ingested after startup or from elsewhere are found. A missed id only triggers one when
+    the directory's or the manifest's mtime changed, so misses on a large directory cost two stats.
+    """
+
+    def __init__(self, transcript_dir: str, manifest=None, refresh_interval: float = 60.0):
+        self.transcript_dir = transcript_dir
+        self.manifest = manifest
+        self.refresh_interval = refresh_interval
+        self._by_id = {}
+        self._files = {}  # path -> (mtime_ns, id)
+        self._lock = threading.Lock()
+        self._last_refresh = None
+        self._dir_mtime_ns = None  # transcript_dir's mtime at the last refresh
+
+    def _dir_mtime(self):
+        try:
+            return os.stat(self.transcript_dir).st_mtime_ns
+        except OSError:
+            return None
+
+    def _sources_changed(self) -> bool:
+        # Adding, removing or replacing a file changes the directory's mtime; ingest rewrites the manifest
+        manifest_changed = self.manifest is not None and self.manifest.reload_if_changed()
+        return manifest_changed or self._dir_mtime() != self._dir_mtime_ns
+
+    def _meta_paths(self):
+        paths = set()
+        if os.path.isdir(self.transcript_dir):
+            paths.update(os.path.abspath(os.path.join(self.transcript_dir, filename))
+                         for filename in os.listdir(self.transcript_dir)
+                         if filename.startswith("META_") and filename.endswith(".json"))
+        if self.manifest is not None:
+            self.manifest.reload_if_changed()
+            paths.update(self.manifest.resolve(path) for path in self.manifest.entries
+                         if os.path.basename(path).startswith("META_") and path.endswith(".json"))
+        return paths
+
+    def refresh(self):
+        """
+        Re-reads META files that are new or whose mtime changed, and drops removed ones.
+        """
+        with self._lock:
+            # Taken before listing, so a file added during the scan still shows up as a change
+            self._dir_mtime_ns = self._dir_mtime()
+            seen = set()
+            for path in self._meta_paths():
+                try:
+                    mtime_ns = os.stat(path).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                seen.add(path)
+                known = self._files.get(path)
+                if known and known[0] == mtime_ns:
+                    continue
+                try:
+                    with open(path, "r") as file:
+                        metadata = json.load(file)
+                except (OSError, ValueError) as e:
+                    print(f"Failed to read metadata file {path}: {e}")
+                    continue
+                if known and known[1] != metadata.get("id"):
+                    self._by_id.pop(known[1], None)
+                self._files[path] = (mtime_ns, metadata.get("id"))
+                self._by_id[metadata.get("id")] = metadata
+
+            for path in set(self._files) - seen:
+                _, video_id = self._files.pop(path)
+                self._by_id.pop(video_id, None)
+            self._last_refresh = time.monotonic()
+
+    def _maybe_refresh(self, missed: bool):
+        # A miss refreshes at most once per second so unknown ids cannot turn every lookup into a scan
+        if self._last_refresh is None:
+            self.refresh()
+            return
+        elapsed = time.monotonic() - self._last_refresh
+        if elapsed >= self.refresh_interval or (missed and elapsed >= 1.0 and self._sources_changed()):
+            self.refresh()
+
+    def get(self, video_id: str) -> dict:
+        self._maybe_refresh(missed=False)
+        metadata = self._by_id.get(video_id)
+        if metadata is None:
+            self._maybe_refresh(missed=True)
+            metadata = self._by_id.get(video_id)
+        return metadata
+
+    def __len__(self):
+        return len(self._by_id)
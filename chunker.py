@@ -0,0 +1,145 @@
+import os
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple, Union
+from langchain.schema import Document
+import metrics
+
+DEFAULT_CHUNK_SIZE = 1024
+DEFAULT_CHUNK_OVERLAP = 20
+
+# Preferred cut points, best first, as in RecursiveCharacterTextSplitter; "" means cut anywhere
+DEFAULT_SEPARATORS = ("\n\n", "\n", " ", "")
+
+# Characters read from a file per block; the buffer never holds more than one block plus one chunk
+READ_SIZE = 64 * 1024
+
+def iter_blocks(source: Union[str, Iterable[str]], block_size: int = READ_SIZE) -> Iterator[str]:
+    """
+    Yields text in blocks from a string, a file opened in text mode, or any iterable of strings.
+    """
+    if isinstance(source, str):
+        for i in range(0, len(source), block_size):
+            yield source[i:i + block_size]
+    elif hasattr(source, "read"):
+        while True:
+            block = source.read(block_size)
+            if not block:
+                return
+            yield block
+    else:
+        yield from source
+
+def _find_cut(buffer: str, pos: int, chunk_size: int, min_size: int, separators) -> int:
+    """
+    Returns the end of the next chunk: just after the last separator that keeps the chunk
+    within chunk_size but with more than min_size characters after any leading whitespace
+    (so the next chunk always starts after this one).
+    """
+    window = buffer[pos:pos + chunk_size]
+    lead = len(window) - len(window.lstrip())
+    for separator in separators:
+        if not separator:
+            break
+        index = window.rfind(separator, lead + min_size)
+        if index != -1:
+            return pos + index + len(separator)
+    return pos + len(window)
+
+def _overlap_start(buffer: str, cut: int, chunk_overlap: int) -> int:
+    """
+    The next chunk repeats at most chunk_overlap characters, starting on a word boundary when there is one.
+    """
+    start = cut - chunk_overlap
+    if chunk_overlap <= 0:
+        return cut
+    space = buffer.find(" ", start, cut)
+    if space != -1 and space + 1 < cut:
+        return space + 1
+    return start
+
+def iter_chunks(source: Union[str, Iterable[str]], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                chunk_overlap: int = DEFAULT_CHUNK_OVERLAP, separators=DEFAULT_SEPARATORS) -> Iterator[Tuple[str, int, int]]:
+    """
+    Yields (chunk, start, end) with source_text[start:end] == chunk, reading the source incrementally.
+
+    Consecutive chunks share up to chunk_overlap characters and offsets count that overlap,
+    so they always point at the exact source text. Chunks are whitespace-stripped; empty ones,
+    and ones that end inside the previous chunk, are skipped. Memory stays bounded by READ_SIZE + chunk_size whatever the input size.
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+    blocks = iter_blocks(source)
+    buffer = ""
+    buffer_start = 0  # source offset of buffer[0]
+    pos = 0
+    exhausted = False
+    previous_end = 0
+
+    while True:
+        # One character of lookahead tells whether a full-size window ends the text
+        while not exhausted and len(buffer) - pos <= chunk_size:
+            block = next(blocks, None)
+            if block is None:
+                exhausted = True
+            else:
+                buffer_start += pos
+                buffer = buffer[pos:] + block
+                pos = 0
+
+        if exhausted and len(buffer) - pos <= chunk_size:
+            cut = len(buffer)
+        else:
+            cut = _find_cut(buffer, pos, chunk_size, chunk_overlap + 1, separators)
+
+        chunk = buffer[pos:cut]
+        stripped = chunk.strip()
+        start = buffer_start + pos + len(chunk) - len(chunk.lstrip())
+        # A chunk ending inside the previous one holds nothing but overlap and whitespace
+        if stripped and start + len(stripped) > previous_end:
+            yield stripped, start, start + len(stripped)
+            previous_end = start + len(stripped)
+
+        if cut >= len(buffer) and exhausted:
+            return
+        pos = _overlap_start(buffer, cut, chunk_overlap)
+
+def iter_documents(source: Union[str, Iterable[str]], metadata: dict, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   chunk_overlap: int = DEFAULT_CHUNK_OVERLAP) -> Iterator[Document]:
+    """
+    Yields Documents whose metadata is a copy of metadata plus the chunk's "start" and "end" offsets.
+    """
+    for chunk, start, end in iter_chunks(source, chunk_size, chunk_overlap):
+        chunk_metadata = metadata.copy()
+        chunk_metadata["start"] = start
+        chunk_metadata["end"] = end
+        yield Document(page_content=chunk, metadata=chunk_metadata)
+
+def iter_file_documents(path: str, metadata: dict, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP) -> Iterator[Document]:
+    # newline="" keeps \r\n as two characters so offsets match the file TranscriptStore slices
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        yield from iter_documents(file, metadata, chunk_size, chunk_overlap)
+
+def split_text_into_documents(text: str, metadata: dict, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                              chunk_overlap: int = DEFAULT_CHUNK_OVERLAP) -> List[Document]:
+    with metrics.span("chunk"):
+        documents = list(iter_documents(text, metadata, chunk_size, chunk_overlap))
+    metrics.incr("chunks", len(documents))
+    return documents
+
+def split_file_into_documents(path: str, metadata: dict, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                              chunk_overlap: int = DEFAULT_CHUNK_OVERLAP) -> List[Document]:
+    with metrics.span("chunk"):
+        documents = list(iter_file_documents(path, metadata, chunk_size, chunk_overlap))
+    metrics.incr("chunks", len(documents))
+    if metrics.is_enabled():
+        metrics.incr("bytes", os.path.getsize(path), stage="chunk")
+    return documents
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -1,64 +1,187 @@
 import os
 import sys
 import json
+import time
+import contextlib
+import argparse
+from collections import deque
 sys.path.append('/Users/sdargude/playground/code/llms/youtubeassistant')
 from vectordb import MilvusVectorDB
 from metadata import create_metadata_collection, process_metadata_file, search_metadata  # Import the function
 from transcript import create_transcript_collection, process_transcript_file
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv 
 from langchain.schema import Document  # Import LangChain Document class
 from utils import read_metadata  # Import the function from utils
+from ingest import run_ingest_pipeline, plan_file, metadata_path_for
+from manifest import IngestManifest
+from vectordb.writer import BufferedWriter
+from embedding_cache import CachedEmbeddings
+from transcript_store import TranscriptStore
+from segments import load_segment_index
+from keyword_index import KeywordIndex, reciprocal_rank_fusion
+from dedup import DedupIndex
+import metrics
 
 load_dotenv()
 
-def create_and_insert_data(transcript_dir, embeddings, expected_dim, milvus_db):
+# During a sequential backfill, files whose rows are inserted are written to the manifest this often
+CHECKPOINT_SECONDS = 60.0
+
+transcript_store = TranscriptStore()
+
+def create_and_insert_data(transcript_dir, embeddings, expected_dim, milvus_db, workers=0, manifest=None,
+                           keyword_index=None, dedup_index=None):
     # Create collections
     create_metadata_collection(milvus_db, collection_name="transcript_metadata")
     create_transcript_collection(milvus_db, collection_name="transcript_collection")
+
+    if manifest is None:
+        manifest = IngestManifest()
+    if keyword_index is None:
+        keyword_index = KeywordIndex.open()
+    if dedup_index is None:
+        dedup_index = DedupIndex.open()
+
+    # Pipelined ingest: reading, chunking, embedding and inserting run concurrently
+    if workers > 0:
+        report = run_ingest_pipeline(transcript_dir, embeddings, expected_dim, milvus_db, workers=workers, manifest=manifest,
+                                     keyword_index=keyword_index, dedup_index=dedup_index)
+        print("Collections.....")
+        print(milvus_db.list_collections())
+        return report
     
-    # Read transcript and metadata files
-    for filename in os.listdir(transcript_dir):
-        if filename.startswith("META_"):
-            print("Skipping...", filename)
-            continue
-        
-        transcript_path = os.path.join(transcript_dir, filename)
-        metadata_path = os.path.join(transcript_dir, f"META_{filename.replace('.txt', '.json')}")
-        
-        if not os.path.exists(metadata_path):
-            print(f"Metadata file not found for {filename}")
-            continue
-        
-        print("Now processing.....", metadata_path)
-        metadata = read_metadata(metadata_path)
-        process_metadata_file(metadata_path, embeddings, expected_dim, milvus_db, collection_name="transcript_metadata")
-        process_transcript_file(transcript_path, metadata, embeddings, expected_dim, milvus_db, collection_name="transcript_collection")
+    # Rows from all files are buffered into large inserts and flushed once per collection on exit.
+    # Files are recorded once the writer has inserted all of their rows; the indexes are saved
+    # before the manifest, so an interrupted backfill resumes after the last checkpoint.
+    inserted = deque()
+    last_checkpoint = time.monotonic()
+
+    def checkpoint():
+        while inserted:
+            manifest.record(*inserted.popleft())
+        keyword_index.save()
+        dedup_index.save()
+        manifest.save()
+
+    # Files are ingested in rounds: a file whose duplicate chunks lost their stored chunk to a later
+    # file in the round is ingested again in the next one, once the writer has drained
+    transcript_paths = [os.path.join(transcript_dir, filename) for filename in os.listdir(transcript_dir)]
+    while transcript_paths:
+        orphaned = set()
+        # The checkpoint callback runs after the writer has drained, even when ingest is interrupted
+        with contextlib.ExitStack() as on_exit, BufferedWriter(milvus_db) as writer:
+            on_exit.callback(checkpoint)
+            # Read transcript and metadata files
+            for transcript_path in transcript_paths:
+                filename = os.path.basename(transcript_path)
+                if filename.startswith("META_") or filename.startswith(".") or not filename.endswith(".txt"):
+                    metrics.incr("files_skipped")
+                    continue
+                
+                metadata_path = metadata_path_for(transcript_path)
+                
+                if not os.path.exists(metadata_path):
+                    print(f"Metadata file not found for {filename}")
+                    continue
+
+                # Skip files whose content hash is unchanged; rows of changed files are deleted by id
+                orphaned.discard(transcript_path)
+                metadata_hash, transcript_hash = plan_file(manifest, milvus_db, transcript_path, metadata_path,
+                                                           "transcript_metadata", "transcript_collection",
+                                                           keyword_index, dedup_index, orphaned)
+                if metadata_hash is None and transcript_hash is None:
+                    metrics.incr("files_unchanged")
+                    continue
+                
+                metrics.event("process_file", path=metadata_path)
+                metadata = read_metadata(metadata_path)
+                completed = []
+                if metadata_hash:
+                    process_metadata_file(metadata_path, embeddings, expected_dim, writer, collection_name="transcript_metadata",
+                                          keyword_index=keyword_index)
+                    completed.append((metadata_path, "transcript_metadata", metadata["id"], metadata_hash))
+                if transcript_hash:
+                    process_transcript_file(transcript_path, metadata, embeddings, expected_dim, writer, collection_name="transcript_collection",
+                                            keyword_index=keyword_index, dedup_index=dedup_index)
+                    completed.append((transcript_path, "transcript_collection", metadata["id"], transcript_hash))
+                writer.when_inserted(lambda completed=completed: inserted.extend(completed))
+                metrics.incr("files_ingested")
+
+                if inserted and time.monotonic() - last_checkpoint >= CHECKPOINT_SECONDS:
+                    checkpoint()
+                    last_checkpoint = time.monotonic()
+
+        # Their rows were recorded by the checkpoint; forget them so the next round re-plans them
+        for transcript_path in orphaned:
+            manifest.remove(transcript_path)
+        transcript_paths = sorted(path for path in orphaned if os.path.exists(path))
+
+    dedup = dedup_index.report()
+    metrics.event("dedup", **dedup)
+    print(f"Skipped {dedup['exact_duplicates']} exact and {dedup['near_duplicates']} near-duplicate chunks "
+          f"(dedup ratio {dedup['dedup_ratio']:.1%})")
         
     print("Collections.....")
     print(milvus_db.list_collections())
 
-def parent_retriever(search_results):
-    documents = []
-    for result in search_results:
+def parent_retriever(search_results, store=None):
+    if store is None:
+        store = transcript_store
+
+    # Group hits by transcript so each file is mapped once and only the hit ranges are decoded
+    hits_by_path = {}
+    for index, result in enumerate(search_results):
         transcript_path = result.get('transcript_path')
         if not transcript_path:
             print("Transcript path not found in result.")
             return []
-        
-        start_offset = result['start']
-        end_offset = result['end']
-         
-        with open(transcript_path, 'r') as file:
-            transcript_text = file.read()
-            extracted_text = transcript_text[start_offset:end_offset]
-            # Remove embeddings field from result
-            result.pop('embeddings', None)
-            documents.append(Document(page_content=extracted_text, metadata=result))
+        hits_by_path.setdefault(transcript_path, []).append(index)
+
+    documents = [None] * len(search_results)
+    with metrics.span("hydrate", source="transcript"):
+        for transcript_path, indices in hits_by_path.items():
+            ranges = [(search_results[i]['start'], search_results[i]['end']) for i in indices]
+            segments = load_segment_index(transcript_path)
+            for i, extracted_text in zip(indices, store.slice_many(transcript_path, ranges)):
+                result = search_results[i]
+                # Remove embeddings field from result
+                result.pop('embeddings', None)
+                if segments is not None:
+                    result['start_time'] = segments.char_to_time(result['start'])
+                documents[i] = Document(page_content=extracted_text, metadata=result)
+    metrics.incr("hydrated_chunks", len(documents))
     
     return documents
 
-def query_data(milvus_db, embeddings):
+def hybrid_search(milvus_db, query, embeddings, keyword_index, topk=10, mode="hybrid",
+                  collection_name="transcript_collection", dedup_index=None):
+    """
+    Returns hydrated transcript chunks for query. mode is "vector", "keyword" (BM25 only, the
+    embedding model is never called) or "hybrid" (both rankings merged by reciprocal rank fusion).
+    With dedup_index, chunks that were not embedded because they duplicate a hit are returned after it.
+    """
+    rankings = []
+    if mode in ("keyword", "hybrid"):
+        rankings.append(keyword_index.search(query, k=topk, collection=collection_name))
+    if mode in ("vector", "hybrid"):
+        with metrics.span("embed", kind="query"):
+            query_embedding = embeddings.encode(query)
+        rankings.append(milvus_db.search_batch(collection_name, [query_embedding],
+                                               output_fields=["id", "transcript_path", "start", "end"],
+                                               topk=topk)[0]["entities"])
+    if not rankings:
+        raise ValueError(f"Unknown search mode '{mode}'")
+
+    search_results = []
+    for hit, score in reciprocal_rank_fusion(*rankings, limit=topk):
+        result = {field: hit[field] for field in ("id", "transcript_path", "start", "end")}
+        result["rrf_score"] = score
+        search_results.append(result)
+    if dedup_index is not None:
+        search_results = dedup_index.expand_hits(search_results)
+    return parent_retriever(search_results)
+
+def query_data(milvus_db, embeddings, query=None, search_mode="vector", keyword_index=None):
     # Retrieve and print all documents from the collection with an optional filter condition and output fields
     filter_condition = 'id == "Xv5nBumG2sw"'
     #filter_condition = 'id == "BBBBBBBBBBBBBBBBBBBB"'
@@ -95,6 +218,12 @@ def query_data(milvus_db, embeddings):
      
     # Search for documents with description similarity and comment count greater than 1000
     
+    # Keyword-only queries never load or call the embedding model
+    if search_mode == "keyword":
+        if query:
+            print_hybrid_results(milvus_db, query, embeddings, search_mode, keyword_index)
+        return
+
     combined_results = search_metadata(
         milvus_db=milvus_db, 
         collection_name="transcript_metadata", 
@@ -119,15 +248,55 @@ def query_data(milvus_db, embeddings):
                 print("Search results for metadata", result.metadata)
                 print("==========")
 
+    if query:
+        print_hybrid_results(milvus_db, query, embeddings, search_mode, keyword_index)
+
+def print_hybrid_results(milvus_db, query, embeddings, search_mode, keyword_index=None, dedup_index=None):
+    if keyword_index is None:
+        keyword_index = KeywordIndex.open()
+    if dedup_index is None:
+        dedup_index = DedupIndex.open()
+    for document in hybrid_search(milvus_db, query, embeddings, keyword_index, mode=search_mode,
+                                  dedup_index=dedup_index):
+        print(f"[{search_mode}] {document.metadata}")
+        print(document.page_content[:200])
+        print("==========")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ingest transcripts into Milvus and query them.")
+    parser.add_argument("--ingest", action="store_true", help="Create collections and insert the transcripts directory")
+    parser.add_argument("--transcript-dir", default="transcripts", help="Directory holding transcripts and META_ files")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Number of reader/chunker workers for the pipelined ingest (0 = sequential)")
+    parser.add_argument("--query", help="Search the transcript chunks for this text")
+    parser.add_argument("--search-mode", choices=["vector", "keyword", "hybrid"], default="vector",
+                        help="Rank --query hits by embeddings, BM25 keywords, or both fused (default: vector)")
+    parser.add_argument("--rebuild-index", nargs="+", metavar="COLLECTION",
+                        help="Rebuild the embeddings index of these collections, sized for their current row count")
+    parser.add_argument("--index-type", choices=["IVF_FLAT", "IVF_SQ8", "IVF_PQ", "HNSW", "auto"],
+                        help="Index type for --rebuild-index (default: each collection's configured type)")
+    parser.add_argument("--search-preset", choices=["latency", "balanced", "recall"],
+                        help="Search-time nprobe/ef preset (default: MILVUS_SEARCH_PRESET or balanced)")
+    parser.add_argument("--metrics-jsonl", help="Record per-stage spans and counters, streaming them to this JSON-lines file")
+    parser.add_argument("--metrics-prom", help="Record metrics and write them in Prometheus text format to this file on exit")
+    return parser.parse_args()
+
 def main():
-    transcript_dir = "transcripts"
+    args = parse_args()
+    transcript_dir = args.transcript_dir
+    if args.metrics_jsonl or args.metrics_prom:
+        metrics.enable(args.metrics_jsonl)
     expected_dim = 384  # Dimension for all-MiniLM-L6-v2
     
-    # Initialize embeddings
-    embeddings = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+    # Initialize embeddings; keyword-only queries do not need the model
+    embeddings = None
+    if args.ingest or args.search_mode != "keyword":
+        from sentence_transformers import SentenceTransformer
+        model_name = 'sentence-transformers/all-MiniLM-L6-v2'
+        embeddings = CachedEmbeddings(SentenceTransformer(model_name), model_name, expected_dim)
     
     # Initialize MilvusVectorDB
-    milvus_db = MilvusVectorDB(embeddings)
+    milvus_db = MilvusVectorDB(embeddings, search_preset=args.search_preset)
 
     #milvus_db.drop_collection("transcript_collection")
     #milvus_db.drop_collection("youtube_weburl_collection")
@@ -135,11 +304,22 @@ def main():
     
     
     # Create and insert data
-    #create_and_insert_data(transcript_dir, embeddings, expected_dim, milvus_db)
+    if args.ingest:
+        create_and_insert_data(transcript_dir, embeddings, expected_dim, milvus_db, workers=args.workers)
+
+    for collection_name in args.rebuild_index or []:
+        milvus_db.rebuild_index(collection_name, index_type=args.index_type)
+
+    # Load the searched collections once up front so the first query does not pay for it
+    if args.search_mode != "keyword":
+        milvus_db.warm_up(["transcript_metadata", "transcript_collection"])
     
     #milvus_db.describe_collection("transcript_metadata")
     # Query data
-    query_data(milvus_db, embeddings)
+    query_data(milvus_db, embeddings, query=args.query, search_mode=args.search_mode)
+
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,152 @@
+import re
+from functools import lru_cache
+from typing import List
+
+DEFAULT_TOKEN_BUDGET = 3000
+DEFAULT_ENCODING = "cl100k_base"
+
+# Longest shared prefix/suffix checked when chunks carry no offsets (chunk_overlap is 20)
+MAX_TEXT_OVERLAP = 200
+
+# A span is only truncated into the remaining budget if at least this many tokens fit
+MIN_PARTIAL_TOKENS = 32
+
+class ApproximateEncoding:
+    """
+    Word/punctuation tokenizer used when the tiktoken encoding cannot be loaded (tiktoken
+    downloads its BPE files on first use, which fails on offline boxes). Leading whitespace
+    stays attached to each token, as in BPE, so decode(encode(text)) keeps the spacing.
+    """
+    _pattern = re.compile(r"\s*\w+|\s*[^\w\s]|\s+$")
+
+    def encode(self, text: str) -> List[str]:
+        return self._pattern.findall(text)
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = DEFAULT_ENCODING):
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        print(f"Failed to load tiktoken encoding '{name}', using approximate token counts: {e}")
+        return ApproximateEncoding()
+
+def _source(doc) -> str:
+    metadata = doc.metadata
+    return metadata.get("transcript_path") or metadata.get("source") or metadata.get("shard") or ""
+
+def _offsets(doc):
+    metadata = doc.metadata
+    if "start" in metadata and "end" in metadata:
+        return metadata["start"], metadata["end"]
+    if "start_index" in metadata and metadata["start_index"] >= 0:
+        return metadata["start_index"], metadata["start_index"] + len(doc.page_content)
+    return None
+
+def _text_overlap(left: str, right: str) -> int:
+    for size in range(min(MAX_TEXT_OVERLAP, len(left), len(right)), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+class Span:
+    def __init__(self, source, start, end, text, score):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.text = text
+        self.score = score
+        self.chunks = 1
+
+def merge_spans(docs, scores) -> List[Span]:
+    """
+    Merges chunks from the same source whose offsets overlap or touch into single spans.
+    Chunks without offsets are merged when one's tail repeats the other's head.
+    """
+    by_source = {}
+    loose = []
+    for doc, score in zip(docs, scores):
+        offsets = _offsets(doc)
+        if offsets is None:
+            loose.append(Span(_source(doc), None, None, doc.page_content, score))
+        else:
+            by_source.setdefault(_source(doc), []).append(Span(_source(doc), offsets[0], offsets[1], doc.page_content, score))
+
+    spans = []
+    for source_spans in by_source.values():
+        source_spans.sort(key=lambda span: span.start)
+        current = source_spans[0]
+        for span in source_spans[1:]:
+            if span.start <= current.end:
+                if span.end > current.end:
+                    current.text += span.text[current.end - span.start:]
+                    current.end = span.end
+                current.score = max(current.score, span.score)
+                current.chunks += 1
+            else:
+                spans.append(current)
+                current = span
+        spans.append(current)
+
+    for span in loose:
+        for kept in spans:
+            if kept.source != span.source:
+                continue
+            if span.text in kept.text:
+                kept.score = max(kept.score, span.score)
+                kept.chunks += 1
+                break
+            overlap = _text_overlap(kept.text, span.text)
+            if overlap:
+                kept.text += span.text[overlap:]
+                kept.score = max(kept.score, span.score)
+                kept.chunks += 1
+                break
+        else:
+            spans.append(span)
+    return spans
+
+def pack_context(docs, token_budget: int = DEFAULT_TOKEN_BUDGET, scores=None, encoding_name: str = DEFAULT_ENCODING):
+    """
+    Packs retrieved documents into at most token_budget tokens.
+    Overlapping chunks are merged into spans. Spans are added by score, best first; a span
+    that does not fit is truncated if at least MIN_PARTIAL_TOKENS still fit, else skipped.
+    scores are "higher is better"; by default the retrieval order is used.
+    Returns (context text, report dict).
+    """
+    encoding = get_encoding(encoding_name)
+    if scores is None:
+        scores = [-rank for rank in range(len(docs))]
+    tokens_in = len(encoding.encode(" ".join(doc.page_content for doc in docs)))
+
+    spans = sorted(merge_spans(docs, scores), key=lambda span: span.score, reverse=True)
+    parts = []
+    used = 0
+    truncated = 0
+    for span in spans:
+        tokens = encoding.encode(span.text)
+        remaining = token_budget - used
+        if len(tokens) > remaining:
+            if remaining < MIN_PARTIAL_TOKENS:
+                continue
+            tokens = tokens[:remaining]
+            span.text = encoding.decode(tokens)
+            truncated += 1
+        parts.append(span.text)
+        used += len(tokens)
+
+    context = "\n".join(parts)
+    report = {
+        "chunks": len(docs),
+        "spans": len(spans),
+        "spans_used": len(parts),
+        "truncated": truncated,
+        "tokens_in": tokens_in,
+        "tokens_out": used,
+        "tokens_saved": max(0, tokens_in - used),
+        "token_budget": token_budget,
+    }
+    return context, report
@@ -0,0 +1,321 @@
+"""
+Near-duplicate chunk detection at ingest.
+
+Web pages repeat navigation bars, cookie banners and footers, and auto-caption transcripts repeat
+channel intros and outros. Every chunk gets a MinHash signature over its word 3-gram shingles plus
+a digest of its normalized text; a chunk whose digest was seen before, or whose estimated shingle
+Jaccard similarity to a stored chunk is at least NEAR_DUPLICATE_JACCARD, is not embedded or inserted
+again. It is recorded as a link to the chunk that was stored, whose vector stands in for it.
+Candidates are found by LSH over bands of the signature, so lookups do not scan the index.
+
+On disk (DEFAULT_DEDUP_INDEX_PATH/signatures.npz): one row per stored chunk (MinHash, digest,
+video id, transcript path, start/end offsets) and one row per linked duplicate (its video id,
+transcript path, offsets and the stored chunk it points at).
+"""
+import os
+import re
+import hashlib
+import threading
+from typing import List
+import numpy as np
+import metrics
+
+DEFAULT_DEDUP_INDEX_PATH = "dedup_index"
+SIGNATURES_FILE = "signatures.npz"
+
+SHINGLE_SIZE = 3
+
+# Chunks sharing at least this fraction of their shingles are near-duplicates. One edited word
+# in a 170-word chunk changes 3 of its ~168 shingles (Jaccard ~0.96); unrelated text is near 0.
+NEAR_DUPLICATE_JACCARD = 0.75
+
+# MinHash signature length, split into LSH_BANDS bands of LSH_ROWS values. Two chunks become
+# candidates when a whole band matches: ~99.8% likely at Jaccard 0.75, ~12% at 0.3, and every
+# candidate is checked against NEAR_DUPLICATE_JACCARD.
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+# Chunks with fewer shingles than this are only deduplicated when identical
+MIN_SHINGLES = 8
+
+_TOKEN = re.compile(r"\w+")
+
+# Fixed multiply-shift hash family (odd multipliers), so signatures stay comparable across runs
+_PERMUTATION_RNG = np.random.default_rng(0x5EED)
+_MULTIPLIERS = _PERMUTATION_RNG.integers(0, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_OFFSETS = _PERMUTATION_RNG.integers(0, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64)
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer, so nearby inputs give unrelated bits
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _rotate(x: np.ndarray, bits: int) -> np.ndarray:
+    return (x << np.uint64(bits)) | (x >> np.uint64(64 - bits))
+
+# Powers of an odd 64-bit constant: a token's hash is sum((byte + 1) * _POWERS[position in token])
+_POWERS = np.cumprod(np.full(256, 0x100000001B3, dtype=np.uint64), dtype=np.uint64)
+
+def _token_hashes(tokens: List[str]) -> np.ndarray:
+    """
+    Polynomial hashes of all tokens computed in one pass over their joined UTF-8 bytes.
+    """
+    data = np.frombuffer(" ".join(tokens).encode("utf-8"), dtype=np.uint8)
+    separators = data == 32
+    starts = np.concatenate(([0], np.flatnonzero(separators) + 1))
+    index = np.arange(len(data))
+    positions = (index - starts[np.cumsum(separators) - separators]) % len(_POWERS)
+    contributions = (data.astype(np.uint64) + np.uint64(1)) * _POWERS[positions]
+    contributions[separators] = 0
+    return np.add.reduceat(contributions, starts)
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """
+    64-bit hashes of the word size-grams of text (of the whole text when it is shorter).
+    Tokens are hashed together in numpy and combined position-sensitively, so no shingle string is built.
+    """
+    tokens = _TOKEN.findall(text.lower())
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        hashes = _mix(_token_hashes(tokens))
+        count = max(1, len(tokens) - size + 1)
+        combined = hashes[:count].copy()
+        for offset in range(1, min(size, len(tokens))):
+            combined ^= _rotate(hashes[offset:offset + count], 64 * offset // size)
+        return _mix(combined)
+
+def minhash(hashes: np.ndarray) -> np.ndarray:
+    """
+    NUM_PERMUTATIONS uint32 minima of the shingle hashes under each hash of the family.
+    The fraction of equal positions in two signatures estimates the shingle sets' Jaccard similarity.
+    """
+    with np.errstate(over="ignore"):
+        permuted = (hashes[:, np.newaxis] * _MULTIPLIERS + _OFFSETS) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.count_nonzero(a == b)) / len(a)
+
+def text_digest(text: str) -> int:
+    # Case and whitespace differences do not make a chunk new
+    return _hash64(" ".join(text.lower().split()).encode("utf-8"))
+
+def _bands(signature: np.ndarray):
+    return [(band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes()) for band in range(LSH_BANDS)]
+
+class DedupIndex:
+    """
+    Persistent index of the MinHash signatures of stored chunks.
+
+    filter_documents() drops exact and near-duplicate chunks from a batch before it is embedded
+    and registers the rest; expand_hits() adds the dropped chunks back to search hits on the
+    chunk they were linked to. remove() forgets a re-ingested video; chunks of other videos that
+    were linked to its chunks lose their stand-in vector, so their transcript paths are returned
+    for re-ingest.
+    """
+
+    def __init__(self, path: str = DEFAULT_DEDUP_INDEX_PATH, threshold: float = NEAR_DUPLICATE_JACCARD):
+        self.path = path
+        self.threshold = threshold
+        self.stats = {"chunks": 0, "exact_duplicates": 0, "near_duplicates": 0}
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.signatures = []  # MinHash per stored chunk, None when too short for near-duplicate matching
+        self.digests = []
+        self.entries = []  # (video id, transcript path, start, end) of each stored chunk
+        self.deleted = set()
+        self.links = []  # (video id, transcript path, start, end, stored entry) of each duplicate
+        self._by_digest = {}
+        self._by_band = {}
+        self._by_entry = {}
+        self._by_target = {}  # stored entry -> its links
+
+    def _index_links(self):
+        self._by_target = {}
+        for link in self.links:
+            self._by_target.setdefault(link[4], []).append(link)
+
+    @classmethod
+    def open(cls, path: str = DEFAULT_DEDUP_INDEX_PATH) -> "DedupIndex":
+        index = cls(path)
+        if os.path.exists(os.path.join(path, SIGNATURES_FILE)):
+            index._load()
+        return index
+
+    def _load(self):
+        with np.load(os.path.join(self.path, SIGNATURES_FILE)) as table:
+            signatures = table["signatures"]
+            # Indexes written before MinHash hold SimHashes; keep their chunks for exact matching only
+            has_signatures = (table["has_signatures"].tolist() if "has_signatures" in table.files
+                              else [False] * len(signatures))
+            for signature, has_signature, digest, video_id, path, start, end in zip(
+                    signatures, has_signatures, table["digests"].tolist(), table["videos"].tolist(),
+                    table["paths"].tolist(), table["starts"].tolist(), table["ends"].tolist()):
+                self._register(signature if has_signature else None, digest, (video_id, path, start, end))
+            self.links = list(zip(table["link_videos"].tolist(), table["link_paths"].tolist(),
+                                  table["link_starts"].tolist(), table["link_ends"].tolist(),
+                                  table["link_targets"].tolist()))
+        self._index_links()
+
+    def __len__(self):
+        return len(self.entries) - len(self.deleted)
+
+    def _register(self, signature, digest: int, entry: tuple) -> int:
+        entry_id = len(self.entries)
+        self.signatures.append(signature)
+        self.digests.append(digest)
+        self.entries.append(entry)
+        self._by_entry[entry] = entry_id
+        if self._by_digest.get(digest) is None or self._by_digest[digest] in self.deleted:
+            self._by_digest[digest] = entry_id
+        if signature is not None:
+            for band in _bands(signature):
+                self._by_band.setdefault(band, []).append(entry_id)
+        return entry_id
+
+    def _find(self, signature, digest: int):
+        """
+        Returns (entry id, "exact" or "near") of a live stored chunk matching the signature, or None.
+        """
+        entry_id = self._by_digest.get(digest)
+        if entry_id is not None and entry_id not in self.deleted:
+            return entry_id, "exact"
+        if signature is None:
+            return None
+        checked = set()
+        for band in _bands(signature):
+            for entry_id in self._by_band.get(band, ()):
+                if entry_id in checked or entry_id in self.deleted:
+                    continue
+                checked.add(entry_id)
+                if similarity(signature, self.signatures[entry_id]) >= self.threshold:
+                    return entry_id, "near"
+        return None
+
+    def filter_documents(self, documents, collection: str = None) -> list:
+        """
+        Returns the documents that are not duplicates of a stored chunk (or of an earlier one in
+        the batch) and registers them as stored. Documents must still hold their text; their
+        metadata supplies id (or source), transcript_path (or source), start and end.
+        """
+        signatures = []
+        with metrics.span("dedup", collection=collection) as span:
+            for doc in documents:
+                features = shingle_hashes(doc.page_content)
+                metadata = doc.metadata
+                source = metadata.get("source", "")
+                entry = (metadata.get("id") or source, metadata.get("transcript_path") or source,
+                         metadata.get("start", 0), metadata.get("end", 0))
+                signatures.append((minhash(features) if len(features) >= MIN_SHINGLES else None,
+                                   text_digest(doc.page_content), entry))
+
+            kept = []
+            links = []
+            with self._lock:
+                for doc, (signature, digest, entry) in zip(documents, signatures):
+                    match = self._find(signature, digest)
+                    if match is None:
+                        self._register(signature, digest, entry)
+                        kept.append(doc)
+                    else:
+                        links.append((entry + (match[0],), match[1]))
+                for link, _ in links:
+                    self.links.append(link)
+                    self._by_target.setdefault(link[4], []).append(link)
+                self.stats["chunks"] += len(documents)
+                for _, kind in links:
+                    self.stats[f"{kind}_duplicates"] += 1
+            for _, kind in links:
+                metrics.incr("dedup_skipped", kind=kind, collection=collection)
+            span.set(chunks=len(documents), kept=len(kept))
+        return kept
+
+    def dedup_ratio(self) -> float:
+        """
+        Fraction of the chunks seen by filter_documents() that were duplicates.
+        """
+        duplicates = self.stats["exact_duplicates"] + self.stats["near_duplicates"]
+        return duplicates / self.stats["chunks"] if self.stats["chunks"] else 0.0
+
+    def report(self) -> dict:
+        return {**self.stats, "dedup_ratio": self.dedup_ratio(), "stored": len(self), "links": len(self.links)}
+
+    def remove(self, video_id: str) -> List[str]:
+        """
+        Forgets the stored chunks and links of video_id. Returns the transcript paths of other
+        videos whose duplicates were linked to the removed chunks; they need to be re-ingested.
+        """
+        with self._lock:
+            removed = {entry_id for entry_id, entry in enumerate(self.entries)
+                       if entry[0] == video_id and entry_id not in self.deleted}
+            self.deleted.update(removed)
+            orphaned = sorted({link[1] for link in self.links if link[4] in removed and link[0] != video_id})
+            self.links = [link for link in self.links if link[0] != video_id and link[4] not in removed]
+            self._index_links()
+        return orphaned
+
+    def expand_hits(self, hits: list) -> list:
+        """
+        Returns hits (dicts with id, transcript_path, start and end) with the duplicates linked to
+        each stored chunk inserted after it, so a match on shared text also returns the other
+        videos that contain it. Added hits copy the stored hit's other fields and keep its id
+        under "duplicate_of".
+        """
+        expanded = []
+        seen = {(hit["id"], hit["transcript_path"], hit["start"], hit["end"]) for hit in hits}
+        with self._lock:
+            for hit in hits:
+                expanded.append(hit)
+                entry_id = self._by_entry.get((hit["id"], hit["transcript_path"], hit["start"], hit["end"]))
+                if entry_id is None or entry_id in self.deleted:
+                    continue
+                for video_id, path, start, end, _ in self._by_target.get(entry_id, ()):
+                    if (video_id, path, start, end) in seen:
+                        continue
+                    seen.add((video_id, path, start, end))
+                    expanded.append({**hit, "id": video_id, "transcript_path": path, "start": start, "end": end,
+                                     "duplicate_of": hit["id"]})
+        return expanded
+
+    def save(self, path: str = None):
+        """
+        Writes the signatures, dropping removed chunks, and swaps the file in with os.replace.
+        """
+        path = path or self.path
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            live = [entry_id for entry_id in range(len(self.entries)) if entry_id not in self.deleted]
+            renumber = {entry_id: i for i, entry_id in enumerate(live)}
+            entries = [self.entries[entry_id] for entry_id in live]
+            links = [link for link in self.links if link[4] in renumber]
+            tmp_path = os.path.join(path, SIGNATURES_FILE + ".tmp.npz")
+            empty = np.zeros(NUM_PERMUTATIONS, dtype=np.uint32)
+            signatures = [self.signatures[entry_id] for entry_id in live]
+            np.savez(tmp_path,
+                     signatures=np.array([empty if signature is None else signature for signature in signatures],
+                                         dtype=np.uint32).reshape(-1, NUM_PERMUTATIONS),
+                     has_signatures=np.array([signature is not None for signature in signatures], dtype=bool),
+                     digests=np.array([self.digests[entry_id] for entry_id in live], dtype=np.uint64),
+                     videos=np.array([entry[0] for entry in entries], dtype=str),
+                     paths=np.array([entry[1] for entry in entries], dtype=str),
+                     starts=np.array([entry[2] for entry in entries], dtype=np.int64),
+                     ends=np.array([entry[3] for entry in entries], dtype=np.int64),
+                     link_videos=np.array([link[0] for link in links], dtype=str),
+                     link_paths=np.array([link[1] for link in links], dtype=str),
+                     link_starts=np.array([link[2] for link in links], dtype=np.int64),
+                     link_ends=np.array([link[3] for link in links], dtype=np.int64),
+                     link_targets=np.array([renumber[link[4]] for link in links], dtype=np.int64))
+            os.replace(tmp_path, os.path.join(path, SIGNATURES_FILE))
+            self.path = path
+            if self.deleted:
+                # Rebuild the lookup tables without the removed chunks
+                self._clear()
+                self._load()
@@ -0,0 +1,66 @@
+import json
+import numpy as np
+import metrics
+
+DEFAULT_BATCH_SIZE = 64
+
+def _encode_batch(embeddings_model, texts):
+    # SentenceTransformer exposes encode(), langchain embeddings expose embed_documents()
+    if hasattr(embeddings_model, "encode"):
+        try:
+            return embeddings_model.encode(texts, batch_size=len(texts))
+        except TypeError:
+            return embeddings_model.encode(texts)
+    return embeddings_model.embed_documents(texts)
+
+def _to_matrix(vectors):
+    if len(vectors) and isinstance(vectors[0], str):
+        vectors = [json.loads(vector) for vector in vectors]
+    return np.asarray(vectors, dtype=np.float32)
+
+def encode_texts(texts, embeddings_model, expected_dim, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Encodes texts in batches of batch_size and returns a float32 matrix of shape (len(texts), expected_dim).
+    When expected_dim is None it is taken from the first batch.
+    """
+    matrix = None if expected_dim is None else np.empty((len(texts), expected_dim), dtype=np.float32)
+    with metrics.span("embed") as span:
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            vectors = _to_matrix(_encode_batch(embeddings_model, batch))
+            if matrix is None and vectors.ndim == 2:
+                expected_dim = vectors.shape[1]
+                matrix = np.empty((len(texts), expected_dim), dtype=np.float32)
+            if vectors.ndim != 2 or vectors.shape[1] != expected_dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[-1]} does not match expected dimension {expected_dim}")
+            matrix[start:start + len(batch)] = vectors
+        span.set(texts=len(texts))
+    metrics.incr("embedded_texts", len(texts))
+    if matrix is None:
+        matrix = np.empty((0, expected_dim or 0), dtype=np.float32)
+    return matrix
+
+def encode_document_groups(document_groups, embeddings_model, expected_dim, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Encodes the chunks of many files together and returns one matrix per group.
+    Batches are filled across file boundaries so small files do not produce small batches.
+    """
+    texts = [doc.page_content for documents in document_groups for doc in documents]
+    matrix = encode_texts(texts, embeddings_model, expected_dim, batch_size)
+
+    matrices = []
+    offset = 0
+    for documents in document_groups:
+        matrices.append(matrix[offset:offset + len(documents)])
+        offset += len(documents)
+    return matrices
+
+def generate_embeddings(documents, embeddings_model, expected_dim, text_field_name, batch_size=DEFAULT_BATCH_SIZE):
+    # Store the original text in the specified field of the metadata
+    for doc in documents:
+        doc.metadata[text_field_name] = doc.page_content
+
+    matrix = encode_texts([doc.page_content for doc in documents], embeddings_model, expected_dim, batch_size)
+    for doc, embedding in zip(documents, matrix):
+        doc.page_content = embedding
+    return documents
@@ -0,0 +1,236 @@
+import os
+import re
+import time
+import atexit
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from embedding import _encode_batch, _to_matrix
+import metrics
+
+DEFAULT_CACHE_DIR = "embedding_cache"
+DEFAULT_MAX_ENTRIES = 200_000
+
+# Fraction of entries evicted at once when the cache is full; each eviction round saves the index
+EVICTION_FRACTION = 1 / 64
+
+# encode() options that do not affect the returned vectors
+ENCODE_PASSTHROUGH_KWARGS = frozenset({"show_progress_bar"})
+
+# Open caches, saved by one atexit hook without keeping them alive
+_open_caches = weakref.WeakSet()
+
+def _save_all():
+    for cache in list(_open_caches):
+        cache.save()
+
+atexit.register(_save_all)
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+class EmbeddingCache:
+    """
+    On-disk cache of embedding vectors for one (model name, dimension) pair.
+
+    Vectors live in a float32 memory-mapped file, one row per slot. A hash index maps
+    sha1(chunk text) to its slot and is kept in LRU order; once max_entries is reached
+    the least recently used slots are reused.
+
+    An evicted slot is only rewritten after an index without its old key has been saved,
+    so a crash can never leave the saved index pointing an old key at a new vector.
+    """
+
+    def __init__(self, model_name: str, dim: int, cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, save_interval: float = 5.0):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        prefix = f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)}_{dim}"
+        self.vectors_path = os.path.join(cache_dir, f"{prefix}.f32")
+        self.index_path = os.path.join(cache_dir, f"{prefix}.index.npz")
+
+        self._lock = threading.Lock()
+        self._slots = OrderedDict()
+        self._free = []
+        self._evicted = []  # slots whose keys are still in the saved index
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._load()
+        _open_caches.add(self)
+
+    def _load(self):
+        capacity = 0
+        if os.path.exists(self.vectors_path):
+            capacity = os.path.getsize(self.vectors_path) // (self.dim * 4)
+        if os.path.exists(self.index_path) and capacity:
+            index = np.load(self.index_path)
+            for key, slot in zip(index["keys"], index["slots"]):
+                if slot < capacity:
+                    self._slots[key.tobytes()] = int(slot)
+        self._open(max(capacity, min(1024, self.max_entries)))
+        used = set(self._slots.values())
+        self._free = [slot for slot in range(self.capacity - 1, -1, -1) if slot not in used]
+
+    def _open(self, capacity: int):
+        with open(self.vectors_path, "ab") as file:
+            file.truncate(capacity * self.dim * 4)
+        self.capacity = capacity
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _grow(self):
+        old_capacity = self.capacity
+        self._vectors.flush()
+        del self._vectors
+        self._open(min(self.max_entries, old_capacity * 2))
+        self._free.extend(range(self.capacity - 1, old_capacity - 1, -1))
+
+    def _allocate(self) -> int:
+        if not self._free and self.capacity < self.max_entries:
+            self._grow()
+        if not self._free:
+            # Full: evict a batch of least recently used entries, then save the index so
+            # their slots can be rewritten safely
+            for _ in range(max(1, min(len(self._slots), int(self.capacity * EVICTION_FRACTION)))):
+                _, slot = self._slots.popitem(last=False)
+                self._evicted.append(slot)
+                self.evictions += 1
+            self._dirty = True
+            self._save_locked()
+        return self._free.pop()
+
+    def get_many(self, texts: List[str]):
+        """
+        Returns (vectors, missing) where vectors[i] is a copy of the cached row or None,
+        and missing lists the indices of texts that were not cached.
+        """
+        vectors = [None] * len(texts)
+        missing = []
+        with self._lock:
+            for i, text in enumerate(texts):
+                slot = self._slots.get(text_key(text))
+                if slot is None:
+                    missing.append(i)
+                    continue
+                self._slots.move_to_end(text_key(text))
+                vectors[i] = np.array(self._vectors[slot])
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        metrics.incr("cache_hits", len(texts) - len(missing), cache="embedding")
+        metrics.incr("cache_misses", len(missing), cache="embedding")
+        return vectors, missing
+
+    def put_many(self, texts: List[str], matrix: np.ndarray):
+        with self._lock:
+            for text, vector in zip(texts, matrix):
+                key = text_key(text)
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = self._allocate()
+                self._slots[key] = slot
+                self._slots.move_to_end(key)
+                self._vectors[slot] = vector
+            self._dirty = True
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self):
+        if not self._dirty:
+            return
+        self._vectors.flush()
+        keys = np.frombuffer(b"".join(self._slots.keys()), dtype=np.uint8).reshape(-1, 20)
+        slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+        tmp_path = f"{self.index_path}.tmp.npz"
+        np.savez(tmp_path, keys=keys, slots=slots)
+        os.replace(tmp_path, self.index_path)
+        # The saved index no longer names the evicted slots, so they may be reused
+        self._free.extend(self._evicted)
+        self._evicted = []
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "dim": self.dim,
+            "entries": len(self._slots),
+            "capacity": self.capacity,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a SentenceTransformer or langchain embeddings model with an EmbeddingCache.
+    Exposes both encode() and embed_documents()/embed_query(), so it can be passed to
+    the Milvus path in client.py and to FAISS in langchainhelper.py.
+    When dim is None the cache is opened on the first computed vector.
+    """
+
+    def __init__(self, model, model_name: str, dim: int = None, cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.model = model
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.cache = EmbeddingCache(model_name, dim, cache_dir, max_entries) if dim else None
+
+    @property
+    def dim(self):
+        return self.cache.dim if self.cache else None
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.cache.dim if self.cache else 0), dtype=np.float32)
+        if self.cache is None:
+            matrix = _to_matrix(_encode_batch(self.model, texts))
+            self.cache = EmbeddingCache(self.model_name, matrix.shape[1], self.cache_dir, self.max_entries)
+            self.cache.misses += len(texts)
+            metrics.incr("cache_misses", len(texts), cache="embedding")
+            self.cache.put_many(texts, matrix)
+            return matrix
+
+        vectors, missing = self.cache.get_many(texts)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            computed = _to_matrix(_encode_batch(self.model, missing_texts))
+            self.cache.put_many(missing_texts, computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        return np.vstack(vectors).astype(np.float32, copy=False)
+
+    def encode(self, texts, batch_size: int = None, **kwargs):
+        # Options such as normalize_embeddings change the vectors, which the cache key does not cover
+        unsupported = set(kwargs) - ENCODE_PASSTHROUGH_KWARGS
+        if unsupported:
+            raise TypeError(f"CachedEmbeddings.encode() does not support {', '.join(sorted(unsupported))}")
+        if isinstance(texts, str):
+            return self._embed([texts])[0]
+        return self._embed(list(texts))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+    def stats(self) -> dict:
+        return self.cache.stats() if self.cache else {"model": self.model_name, "hits": 0, "misses": 0}
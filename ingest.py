@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import queue
+import threading
+from embedding import encode_document_groups, DEFAULT_BATCH_SIZE
+from metadata import construct_metadata_entities, split_text_into_documents as split_metadata_into_documents
+from transcript import construct_transcript_entities
+from chunker import split_file_into_documents
+from utils import read_metadata
+from manifest import IngestManifest, file_hash
+from vectordb.writer import BufferedWriter
+
+# Marks the end of a stage's output on a queue
+_DONE = object()
+
+def id_filter(video_id: str) -> str:
+    # json.dumps quotes and escapes the id the way Milvus string literals expect
+    return f"id == {json.dumps(video_id)}"
+
+def metadata_path_for(transcript_path: str) -> str:
+    directory, filename = os.path.split(transcript_path)
+    return os.path.join(directory, f"META_{filename.replace('.txt', '.json')}")
+
+def plan_file(manifest, milvus_db, transcript_path, metadata_path, metadata_collection, transcript_collection,
+              keyword_index=None, dedup_index=None, orphaned=None):
+    """
+    Compares a transcript/META pair against the manifest and deletes the rows of whichever
+    side changed (and their keyword and dedup index entries), so it can be re-inserted.
+    Returns (metadata_hash, transcript_hash) where a side that is unchanged is None.
+
+    Transcripts whose duplicate chunks were linked to the deleted rows are dropped from the
+    manifest and added to the orphaned set; callers plan those again in the same run.
+    """
+    metadata_hash = file_hash(metadata_path)
+    transcript_hash = file_hash(transcript_path)
+    metadata_changed = not manifest.is_unchanged(metadata_path, metadata_collection, metadata_hash)
+    transcript_changed = not manifest.is_unchanged(transcript_path, transcript_collection, transcript_hash)
+    if not metadata_changed and not transcript_changed:
+        return None, None
+
+    video_id = read_metadata(metadata_path)["id"]
+    for changed, path, collection_name in ((metadata_changed, metadata_path, metadata_collection),
+                                           (transcript_changed, transcript_path, transcript_collection)):
+        if not changed:
+            continue
+        # Delete rows under the previously recorded id too, in case the META file changed it
+        entry = manifest.get(path)
+        for old_id in {video_id, entry["id"] if entry else video_id}:
+            milvus_db.delete(collection_name, id_filter(old_id))
+            if keyword_index is not None:
+                keyword_index.remove(old_id, collection_name)
+            if dedup_index is not None and collection_name == transcript_collection:
+                # Duplicates in other transcripts pointed at the deleted rows; ingest those files again
+                for orphaned_path in dedup_index.remove(old_id):
+                    print(f"Re-ingesting {orphaned_path}: its duplicate chunks were linked to {path}")
+                    manifest.remove(orphaned_path)
+                    if orphaned is not None:
+                        orphaned.add(orphaned_path)
+
+    return (metadata_hash if metadata_changed else None,
+            transcript_hash if transcript_changed else None)
+
+class IngestPipeline:
+    """
+    Pipelined ingestion of a transcripts directory into Milvus.
+
+    Stages are connected by bounded queues:
+        reader/chunker (worker pool) -> embedder -> inserter
+    The inserter feeds a BufferedWriter, which coalesces rows from many files into large inserts
+    and flushes each collection once at the end.
+    """
+
+    def __init__(self, embeddings, expected_dim, milvus_db,
+                 metadata_collection="transcript_metadata",
+                 transcript_collection="transcript_collection",
+                 workers=4, queue_size=64, embed_batch_size=DEFAULT_BATCH_SIZE,
+                 embed_files_per_batch=8, insert_batch_rows=5000, manifest=None, keyword_index=None,
+                 dedup_index=None):
+        self.embeddings = embeddings
+        self.expected_dim = expected_dim
+        self.milvus_db = milvus_db
+        self.metadata_collection = metadata_collection
+        self.transcript_collection = transcript_collection
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.embed_batch_size = embed_batch_size
+        self.embed_files_per_batch = embed_files_per_batch
+        self.insert_batch_rows = insert_batch_rows
+        self.manifest = manifest if manifest is not None else IngestManifest()
+        self.keyword_index = keyword_index
+        self.dedup_index = dedup_index
+
+        self.stats = {"files": 0, "skipped": 0, "unchanged": 0, "chunks": 0, "inserts": 0}
+        self._lock = threading.Lock()
+        self._errors = []
+        self._completed = []
+
+    def list_transcript_files(self, transcript_dir):
+        jobs = []
+        transcript_paths = [os.path.join(transcript_dir, filename) for filename in sorted(os.listdir(transcript_dir))]
+        while transcript_paths:
+            orphaned = set()
+            for transcript_path in transcript_paths:
+                filename = os.path.basename(transcript_path)
+                if filename.startswith("META_") or filename.startswith(".") or not filename.endswith(".txt"):
+                    continue
+
+                metadata_path = metadata_path_for(transcript_path)
+                if not os.path.exists(metadata_path):
+                    print(f"Metadata file not found for {filename}")
+                    with self._lock:
+                        self.stats["skipped"] += 1
+                    continue
+
+                orphaned.discard(transcript_path)
+                metadata_hash, transcript_hash = plan_file(self.manifest, self.milvus_db, transcript_path, metadata_path,
+                                                           self.metadata_collection, self.transcript_collection,
+                                                           self.keyword_index, self.dedup_index, orphaned)
+                if metadata_hash is None and transcript_hash is None:
+                    self.stats["unchanged"] += 1
+                    continue
+                jobs.append((transcript_path, metadata_path, metadata_hash, transcript_hash))
+            # Files already planned (as unchanged) when a later file orphaned their duplicates
+            planned = {job[0] for job in jobs}
+            transcript_paths = sorted(path for path in orphaned if path not in planned and os.path.exists(path))
+        return jobs
+
+    def run(self, transcript_dir):
+        """
+        Runs all stages over transcript_dir and returns the throughput report.
+        """
+        jobs = self.list_transcript_files(transcript_dir)
+        path_queue = queue.Queue()
+        chunk_queue = queue.Queue(maxsize=self.queue_size)
+        insert_queue = queue.Queue(maxsize=self.queue_size)
+
+        for job in jobs:
+            path_queue.put(job)
+        for _ in range(self.workers):
+            path_queue.put(_DONE)
+
+        started = time.perf_counter()
+        readers = [threading.Thread(target=self._read_and_chunk, args=(path_queue, chunk_queue), daemon=True)
+                   for _ in range(self.workers)]
+        embedder = threading.Thread(target=self._embed, args=(chunk_queue, insert_queue), daemon=True)
+        inserter = threading.Thread(target=self._insert, args=(insert_queue,), daemon=True)
+
+        for thread in readers + [embedder, inserter]:
+            thread.start()
+        for thread in readers:
+            thread.join()
+        chunk_queue.put(_DONE)
+        embedder.join()
+        inserter.join()
+        elapsed = time.perf_counter() - started
+
+        if self._errors:
+            raise self._errors[0]
+
+        # Only record files once all of their rows are inserted and flushed
+        for transcript_path, metadata_path, metadata_hash, transcript_hash, video_id in self._completed:
+            if metadata_hash:
+                self.manifest.record(metadata_path, self.metadata_collection, video_id, metadata_hash)
+            if transcript_hash:
+                self.manifest.record(transcript_path, self.transcript_collection, video_id, transcript_hash)
+        self.manifest.save()
+        if self.keyword_index is not None:
+            self.keyword_index.save()
+        if self.dedup_index is not None:
+            self.dedup_index.save()
+
+        report = self.report(elapsed)
+        print(f"Ingested {report['files']} files / {report['chunks']} chunks in {report['seconds']:.2f}s "
+              f"({report['files_per_sec']:.2f} files/s, {report['chunks_per_sec']:.2f} chunks/s)")
+        if "dedup" in report:
+            print(f"Skipped {report['dedup']['exact_duplicates']} exact and {report['dedup']['near_duplicates']} "
+                  f"near-duplicate chunks (dedup ratio {report['dedup']['dedup_ratio']:.1%})")
+        return report
+
+    def report(self, elapsed):
+        elapsed = max(elapsed, 1e-9)
+        report = {
+            **self.stats,
+            "workers": self.workers,
+            "seconds": elapsed,
+            "files_per_sec": self.stats["files"] / elapsed,
+            "chunks_per_sec": self.stats["chunks"] / elapsed,
+        }
+        if self.dedup_index is not None:
+            report["dedup"] = self.dedup_index.report()
+        return report
+
+    def _read_and_chunk(self, path_queue, chunk_queue):
+        while True:
+            job = path_queue.get()
+            if job is _DONE:
+                return
+            if self._errors:
+                continue
+            transcript_path, metadata_path, metadata_hash, transcript_hash = job
+            try:
+                metadata = read_metadata(metadata_path)
+                meta_documents = []
+                if metadata_hash:
+                    description = metadata.get("description") or ""
+                    metadata_copy = {k: v for k, v in metadata.items() if k != "description"}
+                    meta_documents = split_metadata_into_documents(description, metadata_copy)
+
+                transcript_documents = []
+                if transcript_hash:
+                    transcript_documents = split_file_into_documents(
+                        transcript_path, {"id": metadata["id"], "transcript_path": transcript_path})
+
+                # Index the same chunks for keyword search while page_content still holds the text
+                if self.keyword_index is not None:
+                    self.keyword_index.add_documents(meta_documents, self.metadata_collection, extra_fields=("title",))
+                    self.keyword_index.add_documents(transcript_documents, self.transcript_collection)
+
+                # Boilerplate repeated across transcripts is embedded and stored once; hits on it are
+                # expanded to every copy at query time (DedupIndex.expand_hits)
+                if self.dedup_index is not None:
+                    transcript_documents = self.dedup_index.filter_documents(transcript_documents, self.transcript_collection)
+            except Exception as e:
+                print(f"Failed to read {transcript_path}: {e}")
+                self._errors.append(e)
+                continue
+            with self._lock:
+                self._completed.append((transcript_path, metadata_path, metadata_hash, transcript_hash, metadata["id"]))
+            chunk_queue.put((meta_documents, transcript_documents))
+
+    def _embed(self, chunk_queue, insert_queue):
+        pending = []
+        while True:
+            item = chunk_queue.get()
+            if item is not _DONE:
+                pending.append(item)
+            if pending and (item is _DONE or len(pending) >= self.embed_files_per_batch):
+                try:
+                    self._embed_files(pending, insert_queue)
+                except Exception as e:
+                    print(f"Failed to embed documents: {e}")
+                    self._errors.append(e)
+                pending = []
+            if item is _DONE:
+                insert_queue.put(_DONE)
+                return
+
+    def _embed_files(self, files, insert_queue):
+        groups = []
+        for meta_documents, transcript_documents in files:
+            groups.append(meta_documents)
+            groups.append(transcript_documents)
+
+        # Keep the original text, then replace page_content with the vector as generate_embeddings does
+        for documents, field in zip(groups, ["description", "text"] * len(files)):
+            for doc in documents:
+                doc.metadata[field] = doc.page_content
+
+        matrices = encode_document_groups(groups, self.embeddings, self.expected_dim, self.embed_batch_size)
+        for documents, matrix in zip(groups, matrices):
+            for doc, embedding in zip(documents, matrix):
+                doc.page_content = embedding
+
+        for meta_documents, transcript_documents in files:
+            insert_queue.put((construct_metadata_entities(meta_documents),
+                              construct_transcript_entities(transcript_documents)))
+            with self._lock:
+                self.stats["files"] += 1
+                self.stats["chunks"] += len(meta_documents) + len(transcript_documents)
+
+    def _insert(self, insert_queue):
+        # Rows are coalesced across files and flushed once per collection at the end
+        writer = BufferedWriter(self.milvus_db, max_rows=self.insert_batch_rows)
+        while True:
+            item = insert_queue.get()
+            if item is _DONE:
+                break
+            if self._errors:
+                continue  # keep draining so the embedder never blocks on a full queue
+            try:
+                writer.write(self.metadata_collection, item[0])
+                writer.write(self.transcript_collection, item[1])
+            except Exception as e:
+                self._errors.append(e)
+        try:
+            writer.close()
+        except Exception as e:
+            if not self._errors:
+                self._errors.append(e)
+        with self._lock:
+            self.stats["inserts"] += writer.stats["inserts"]
+
+def run_ingest_pipeline(transcript_dir, embeddings, expected_dim, milvus_db, workers=4, **kwargs):
+    pipeline = IngestPipeline(embeddings, expected_dim, milvus_db, workers=workers, **kwargs)
+    return pipeline.run(transcript_dir)
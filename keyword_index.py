@@ -0,0 +1,325 @@
+"""
+BM25 keyword index over the ingested chunks.
+
+Entity lookups ("ASML", a person's name) are answered from an inverted index without touching
+the embedding model; reciprocal_rank_fusion() merges its ranking with vector search hits.
+
+On disk (DEFAULT_KEYWORD_INDEX_PATH/):
+  postings.bin  per term: doc-id deltas packed at the narrowest width that fits (1, 2 or 4 bytes),
+                then one saturating uint8 term frequency per posting
+  index.npz     sorted term table (offsets, counts, widths) and the per-chunk table
+                (length, video id, collection, transcript path, start/end offsets)
+"""
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, List, Tuple
+import numpy as np
+import metrics
+
+DEFAULT_KEYWORD_INDEX_PATH = "keyword_index"
+POSTINGS_FILE = "postings.bin"
+TABLE_FILE = "index.npz"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+MAX_TF = 255  # term frequencies are stored as uint8; BM25 saturates long before this
+
+_WIDTHS = {1: np.uint8, 2: np.uint16, 4: np.uint32}
+_TOKEN = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+def _pack(doc_ids, tfs) -> Tuple[bytes, int]:
+    """
+    Returns (delta-encoded ids + uint8 tfs, width). doc_ids must be increasing.
+    """
+    ids = np.asarray(doc_ids, dtype=np.int64)
+    deltas = np.diff(ids, prepend=0)
+    top = int(deltas.max()) if len(deltas) else 0
+    width = 1 if top <= 0xFF else 2 if top <= 0xFFFF else 4
+    packed = deltas.astype(_WIDTHS[width]).tobytes()
+    return packed + np.minimum(np.asarray(tfs), MAX_TF).astype(np.uint8).tobytes(), width
+
+def _unpack(buffer, offset: int, count: int, width: int):
+    ids = np.frombuffer(buffer, dtype=_WIDTHS[width], count=count, offset=offset).cumsum(dtype=np.int64)
+    tfs = np.frombuffer(buffer, dtype=np.uint8, count=count, offset=offset + count * width)
+    return ids, tfs
+
+class _Strings:
+    """
+    Interns the repeated strings of the chunk table (video ids, paths, collection names).
+    """
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.index = {value: i for i, value in enumerate(self.values)}
+
+    def intern(self, value: str) -> int:
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+    def encode(self) -> np.ndarray:
+        return np.frombuffer("\0".join(self.values).encode("utf-8"), dtype=np.uint8)
+
+    @classmethod
+    def decode(cls, blob: np.ndarray, count: int):
+        return cls(blob.tobytes().decode("utf-8").split("\0") if count else [])
+
+class KeywordIndex:
+    """
+    Inverted index with BM25 ranking. Chunks are added with their video id, collection and
+    source offsets, so hits can be hydrated by client.parent_retriever like vector hits.
+
+    A loaded index serves postings straight from the memory-mapped postings file. Postings added
+    afterwards go to a small in-memory delta per term (doc ids only grow, so the delta always
+    follows the on-disk list) and are merged into the file by the next save().
+    """
+
+    def __init__(self, path: str = DEFAULT_KEYWORD_INDEX_PATH):
+        self.path = path
+        self.lengths = array("I")
+        self.starts = array("q")
+        self.ends = array("q")
+        self.videos = array("i")
+        self.paths = array("i")
+        self.collections = array("i")
+        self.deleted = set()
+        self.strings = _Strings()
+        self._memory: Dict[str, Tuple[array, array]] = {}  # term -> (doc ids, tfs) added since the last save
+        self._disk_terms: Dict[str, int] = {}
+        self._disk_offsets = self._disk_counts = self._disk_widths = None
+        self._postings = None
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    @classmethod
+    def open(cls, path: str = DEFAULT_KEYWORD_INDEX_PATH) -> "KeywordIndex":
+        """
+        Loads the index saved at path, or returns an empty one that will be saved there.
+        """
+        index = cls(path)
+        if os.path.exists(os.path.join(path, TABLE_FILE)):
+            index._load()
+        return index
+
+    def _load(self):
+        with np.load(os.path.join(self.path, TABLE_FILE)) as table:
+            terms = _Strings.decode(table["terms"], len(table["term_offsets"])).values
+            self._disk_terms = {term: i for i, term in enumerate(terms)}
+            self._disk_offsets = table["term_offsets"]
+            self._disk_counts = table["term_counts"]
+            self._disk_widths = table["term_widths"]
+            self.lengths = array("I", table["lengths"].tobytes())
+            self.starts = array("q", table["starts"].tobytes())
+            self.ends = array("q", table["ends"].tobytes())
+            self.videos = array("i", table["videos"].tobytes())
+            self.paths = array("i", table["paths"].tobytes())
+            self.collections = array("i", table["collections"].tobytes())
+            self.deleted = set(table["deleted"].tolist())
+            self.strings = _Strings.decode(table["strings"], int(table["string_count"]))
+        self._total_length = sum(length for doc_id, length in enumerate(self.lengths) if doc_id not in self.deleted)
+        postings_path = os.path.join(self.path, POSTINGS_FILE)
+        self._postings = np.memmap(postings_path, dtype=np.uint8, mode="r") if os.path.getsize(postings_path) else b""
+
+    def __len__(self):
+        return len(self.lengths) - len(self.deleted)
+
+    def _term_postings(self, term: str):
+        i = self._disk_terms.get(term)
+        disk = None if i is None else _unpack(self._postings, int(self._disk_offsets[i]),
+                                               int(self._disk_counts[i]), int(self._disk_widths[i]))
+        delta = self._memory.get(term)
+        if delta is None:
+            return disk
+        ids = np.frombuffer(delta[0], dtype=np.int64)
+        tfs = np.frombuffer(delta[1], dtype=np.uint8)
+        if disk is None:
+            return ids, tfs
+        return np.concatenate((disk[0], ids)), np.concatenate((disk[1], tfs))
+
+    def add(self, text: str, video_id: str, collection: str, transcript_path: str = "", start: int = 0, end: int = 0) -> int:
+        counts = Counter(tokenize(text))
+        with self._lock:
+            doc_id = len(self.lengths)
+            length = sum(counts.values())
+            self.lengths.append(length)
+            self.starts.append(start)
+            self.ends.append(end)
+            self.videos.append(self.strings.intern(video_id))
+            self.paths.append(self.strings.intern(transcript_path or ""))
+            self.collections.append(self.strings.intern(collection))
+            self._total_length += length
+            for term, tf in counts.items():
+                postings = self._memory.get(term)
+                if postings is None:
+                    postings = self._memory[term] = (array("q"), array("B"))
+                postings[0].append(doc_id)
+                postings[1].append(min(tf, MAX_TF))
+        return doc_id
+
+    def add_documents(self, documents, collection: str, extra_fields=()):
+        """
+        Adds chunk Documents (metadata id, and for transcripts transcript_path/start/end) before
+        page_content is replaced by the embedding. Metadata fields in extra_fields (e.g. "title")
+        are indexed with each chunk's text.
+        """
+        with metrics.span("keyword_index", collection=collection):
+            for doc in documents:
+                metadata = doc.metadata
+                text = " ".join([str(metadata.get(field) or "") for field in extra_fields] + [doc.page_content])
+                self.add(text, metadata["id"], collection, metadata.get("transcript_path", ""),
+                         metadata.get("start", 0), metadata.get("end", 0))
+
+    def remove(self, video_id: str, collection: str = None) -> int:
+        """
+        Drops every chunk of video_id (in collection, when given); used before a changed file is re-ingested.
+        """
+        with self._lock:
+            video = self.strings.index.get(video_id)
+            if video is None:
+                return 0
+            matches = np.flatnonzero(np.frombuffer(self.videos, dtype=np.int32) == video)
+            if collection is not None:
+                wanted = self.strings.index.get(collection, -1)
+                matches = matches[np.frombuffer(self.collections, dtype=np.int32)[matches] == wanted]
+            removed = [doc_id for doc_id in matches.tolist() if doc_id not in self.deleted]
+            self.deleted.update(removed)
+            self._total_length -= sum(self.lengths[doc_id] for doc_id in removed)
+            return len(removed)
+
+    def search(self, query: str, k: int = 10, collection: str = None) -> List[dict]:
+        """
+        Returns up to k hits, best first, as dicts with id, collection, transcript_path, start, end and score.
+        """
+        terms = set(tokenize(query))
+        with metrics.span("search", backend="keyword"), self._lock:
+            live = len(self)
+            if not terms or not live:
+                return []
+            average_length = self._total_length / live
+            lengths = np.frombuffer(self.lengths, dtype=np.uint32)
+            all_ids, all_scores = [], []
+            for term in terms:
+                postings = self._term_postings(term)
+                if postings is None:
+                    continue
+                ids, tfs = postings
+                idf = np.log(1.0 + (live - len(ids) + 0.5) / (len(ids) + 0.5))
+                tf = tfs.astype(np.float32)
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[ids] / average_length)
+                all_ids.append(ids)
+                all_scores.append(idf * tf * (BM25_K1 + 1.0) / (tf + norm))
+            if not all_ids:
+                return []
+
+            ids = np.concatenate(all_ids)
+            scores = np.concatenate(all_scores)
+            ids, inverse = np.unique(ids, return_inverse=True)
+            scores = np.bincount(inverse, weights=scores)
+            keep = np.ones(len(ids), dtype=bool)
+            if self.deleted:
+                keep &= ~np.isin(ids, np.fromiter(self.deleted, dtype=np.int64))
+            if collection is not None:
+                wanted = self.strings.index.get(collection, -1)
+                keep &= np.frombuffer(self.collections, dtype=np.int32)[ids] == wanted
+            ids, scores = ids[keep], scores[keep]
+            if len(ids) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                ids, scores = ids[top], scores[top]
+            order = np.argsort(-scores, kind="stable")
+
+            values = self.strings.values
+            hits = [{
+                "id": values[self.videos[doc_id]],
+                "collection": values[self.collections[doc_id]],
+                "transcript_path": values[self.paths[doc_id]],
+                "start": self.starts[doc_id],
+                "end": self.ends[doc_id],
+                "score": float(score),
+                "doc_id": doc_id,
+            } for doc_id, score in zip(ids[order].tolist(), scores[order].tolist())]
+        metrics.incr("keyword_hits", len(hits))
+        return hits
+
+    def save(self, path: str = None):
+        """
+        Writes the postings and tables, dropping removed chunks from the postings.
+        Files are written next to the old ones and swapped in with os.replace.
+        """
+        path = path or self.path
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            terms = sorted(set(self._disk_terms) | set(self._memory))
+            offsets = np.empty(len(terms), dtype=np.int64)
+            counts = np.empty(len(terms), dtype=np.int64)
+            widths = np.empty(len(terms), dtype=np.uint8)
+            deleted = np.fromiter(self.deleted, dtype=np.int64) if self.deleted else None
+            offset = 0
+            kept_terms = []
+            postings_tmp = os.path.join(path, POSTINGS_FILE + ".tmp")
+            with open(postings_tmp, "wb") as file:
+                for term in terms:
+                    ids, tfs = self._term_postings(term)
+                    if deleted is not None:
+                        live = ~np.isin(ids, deleted)
+                        ids, tfs = ids[live], tfs[live]
+                    if not len(ids):
+                        continue
+                    packed, width = _pack(ids, tfs)
+                    i = len(kept_terms)
+                    kept_terms.append(term)
+                    offsets[i], counts[i], widths[i] = offset, len(ids), width
+                    file.write(packed)
+                    offset += len(packed)
+
+            term_strings = _Strings(kept_terms)
+            table_tmp = os.path.join(path, TABLE_FILE + ".tmp.npz")
+            np.savez(table_tmp,
+                     terms=term_strings.encode(), term_offsets=offsets[:len(kept_terms)],
+                     term_counts=counts[:len(kept_terms)], term_widths=widths[:len(kept_terms)],
+                     lengths=np.frombuffer(self.lengths, dtype=np.uint32),
+                     starts=np.frombuffer(self.starts, dtype=np.int64),
+                     ends=np.frombuffer(self.ends, dtype=np.int64),
+                     videos=np.frombuffer(self.videos, dtype=np.int32),
+                     paths=np.frombuffer(self.paths, dtype=np.int32),
+                     collections=np.frombuffer(self.collections, dtype=np.int32),
+                     deleted=np.fromiter(self.deleted, dtype=np.int64),
+                     strings=self.strings.encode(), string_count=len(self.strings.values))
+            # Release the old mapping before replacing the file under it
+            self._postings = None
+            os.replace(postings_tmp, os.path.join(path, POSTINGS_FILE))
+            os.replace(table_tmp, os.path.join(path, TABLE_FILE))
+            self.path = path
+            self._memory.clear()
+            self._load()
+
+def _default_key(item):
+    metadata = item.metadata if hasattr(item, "metadata") else item
+    return (metadata.get("id"), metadata.get("transcript_path"), metadata.get("start"), metadata.get("end"))
+
+def reciprocal_rank_fusion(*rankings, k: int = RRF_K, key=_default_key, limit: int = None) -> List[tuple]:
+    """
+    Fuses ranked lists (keyword hits, vector hits, ...) by summing 1 / (k + rank) per item.
+    Items are matched across lists by key (video id, transcript path and offsets by default);
+    the first list an item appears in supplies it. Returns [(item, fused score)], best first.
+    """
+    scores = {}
+    items = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            item_key = key(item)
+            scores[item_key] = scores.get(item_key, 0.0) + 1.0 / (k + rank)
+            items.setdefault(item_key, item)
+    fused = sorted(scores.items(), key=lambda entry: entry[1], reverse=True)
+    if limit is not None:
+        fused = fused[:limit]
+    return [(items[item_key], score) for item_key, score in fused]
@@ -1,31 +1,88 @@
-from youtube import Youtube
-from weburl import WebURL
-from TranscriptFactory import TranscriptFactory
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.prompts import PromptTemplate
-from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders.youtube import TranscriptFormat
-
-from langchain_ollama import OllamaLLM
-from langchain_openai import OpenAI
-from langchain_ollama import OllamaEmbeddings
-
 import os
+import time
 import hashlib
+import threading
 from typing import List, Type
-from langchain.schema import Document
+from langchain_core.documents import Document
 from dotenv import load_dotenv
+import metrics
 
 load_dotenv()
-embeddings = OllamaEmbeddings(model='llama3')
 small_model = "llama3.1"
 big_model = "llama3.1:70b"
+embedding_model = "llama3"
+
+# Token budget for the retrieved transcript text in the prompt; see context_packer
+DEFAULT_CONTEXT_TOKENS = 3000
+
+# Created on first use and then shared; see get_embeddings()
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+def get_embeddings():
+    """
+    Returns the shared cached Ollama embeddings, creating them on first use so that
+    importing this module does not load langchain_ollama.
+    """
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            from langchain_ollama import OllamaEmbeddings
+            from embedding_cache import CachedEmbeddings
+            _embeddings = CachedEmbeddings(OllamaEmbeddings(model=embedding_model), f"ollama/{embedding_model}")
+        return _embeddings
+
+def set_embeddings(embeddings):
+    """
+    Replaces the shared embeddings, e.g. with a local model or the benchmark's fake embeddings.
+    """
+    global _embeddings
+    with _embeddings_lock:
+        _embeddings = embeddings
+
+_shard_manager = None
+_retrieval_cache = None
+
+def get_retrieval_cache():
+    """
+    Returns the shared cache of query embeddings and retrieved chunk ids used by get_response_from_query.
+    """
+    global _retrieval_cache
+    from retrieval_cache import RetrievalCache
+    with _embeddings_lock:
+        if _retrieval_cache is None:
+            _retrieval_cache = RetrievalCache()
+        return _retrieval_cache
+
+def get_shard_manager(memory_budget: int = None):
+    """
+    Returns the shared ShardManager over every per-video index in vdb/. It has the same
+    similarity_search() as a single FAISS db, so it can be passed to get_response_from_query
+    to ask a question across all videos.
+    """
+    global _shard_manager
+    from shards import ShardManager, DEFAULT_MEMORY_BUDGET
+    embeddings = get_embeddings()
+    with _embeddings_lock:
+        if _shard_manager is None:
+            _shard_manager = ShardManager(embeddings, root="vdb", memory_budget=memory_budget or DEFAULT_MEMORY_BUDGET)
+        return _shard_manager
+
+def __getattr__(name: str):
+    # Keeps langchainhelper.embeddings working for existing callers
+    if name == "embeddings":
+        return get_embeddings()
+    raise AttributeError(f"module 'langchainhelper' has no attribute '{name}'")
 
 class VectorDBFactory:
     @staticmethod
     def create_vector_db(db_type: str, documents: List[Document], dbname: str):
         if db_type == "FAISS":
-            db = FAISS.from_documents(documents, embeddings)
+            from langchain_community.vectorstores import FAISS
+            # Embeds and indexes the chunks in one call
+            with metrics.span("insert", backend="faiss"):
+                db = FAISS.from_documents(documents, get_embeddings())
+            metrics.incr("rows_inserted", len(documents), collection=os.path.basename(dbname))
             db.save_local(dbname)
             return db
         # Add other database types here
@@ -33,6 +90,8 @@ class VectorDBFactory:
             raise ValueError(f"Unsupported database type: {db_type}")
 
 def get_transcript_file_path(url: str) -> str:
+    from youtube import Youtube
+    from TranscriptFactory import TranscriptFactory
     transcript_instance = TranscriptFactory.create_transcript(url)
     if isinstance(transcript_instance, Youtube):
         video_id = transcript_instance.extract_video_id(url)
@@ -44,36 +103,28 @@ def get_transcript_file_path(url: str) -> str:
 
 def create_vector_db_from_transcript_file(transcript_path: str, dbname: str, db_type: str = "FAISS") -> Type:
     vdb_path = os.path.join("vdb", dbname)
-    print("DBNAME : ", vdb_path)
+    metrics.event("vector_db", path=vdb_path)
     if os.path.exists(vdb_path):
         if db_type == "FAISS":
             print("Loading the existing db from:", vdb_path)
-            newdb = FAISS.load_local(vdb_path, embeddings, allow_dangerous_deserialization=True)
+            from langchain_community.vectorstores import FAISS
+            newdb = FAISS.load_local(vdb_path, get_embeddings(), allow_dangerous_deserialization=True)
+            # Retrieval cache entries are keyed by the transcript checksum the db is named after
+            newdb.checksum = dbname
             return newdb
         # Add other database types here
         else:
             raise ValueError(f"Unsupported database type: {db_type}")
 
-    with open(transcript_path, "r") as file:
-        transcript = file.read()
-
-    textsplitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=20, length_function=len, is_separator_regex=False)
-    all_split_docs = textsplitter.split_documents([Document(page_content=transcript)])
+    from chunker import split_file_into_documents
+    all_split_docs = split_file_into_documents(transcript_path, {"source": transcript_path}, chunk_size=1000)
     
     db = VectorDBFactory.create_vector_db(db_type, all_split_docs, vdb_path)
+    db.checksum = dbname
     print(f"Vector database saved to: {vdb_path}")
     return db
 
-def get_response_from_query(db, query, k=4):
-    docs = db.similarity_search(query, k)
-    print("Retrieved", len(docs), "Documents")
-    docspagecontent = " ".join([d.page_content for d in docs])
-
-    llm = OllamaLLM(model=small_model)
-
-    prompt = PromptTemplate(
-        input_variables=['question', "docs"],
-        template="""
+PROMPT_TEMPLATE = """
         you are a helpful Youtube assistant that can answer questions about videos based on the video's transcript. 
         Answer the following question {question} by searching the following video transcript: {docs}
         Only use the factual information from the transcript to answer the question. 
@@ -82,9 +133,122 @@ def get_response_from_query(db, query, k=4):
         Title: <Text> <newline>
         Summary:
         """
-    )
-    chain = prompt | llm
-    response = chain.invoke({"question": query, "docs": docspagecontent})
+
+STUB_RESPONSE = "Title: Stub answer Summary: This answer was produced by the stub LLM without calling Ollama."
+
+def _ollama_llm(model: str):
+    from langchain_ollama import OllamaLLM
+    return OllamaLLM(model=model)
+
+def _stub_llm(model: str):
+    # Streams a canned answer one character at a time, for tests and benchmarks without Ollama
+    from langchain_core.language_models.fake import FakeStreamingListLLM
+    return FakeStreamingListLLM(responses=[os.getenv("STUB_LLM_RESPONSE", STUB_RESPONSE)])
+
+# LLM backends by name; LLM_BACKEND selects the default
+LLM_BACKENDS = {
+    "ollama": _ollama_llm,
+    "stub": _stub_llm,
+}
+
+def register_llm_backend(name: str, factory):
+    LLM_BACKENDS[name] = factory
+
+def get_llm(backend: str = None, model: str = None):
+    backend = backend or os.getenv("LLM_BACKEND", "ollama")
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"Unsupported LLM backend: {backend}")
+    return LLM_BACKENDS[backend](model or small_model)
+
+class AnswerStats:
+    """
+    Latency of one streamed answer: time to first token, tokens/s and total time.
+    Streamed chunks are counted as tokens, which is what Ollama streams.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.tokens = 0
+
+    def record_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.tokens += 1
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+
+    @property
+    def time_to_first_token(self) -> float:
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    @property
+    def total_latency(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started
+
+    @property
+    def tokens_per_sec(self) -> float:
+        if self.first_token_at is None or self.tokens < 2:
+            return 0.0
+        generation = (self.finished_at or time.perf_counter()) - self.first_token_at
+        return (self.tokens - 1) / generation if generation > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "ttft": self.time_to_first_token,
+            "tokens": self.tokens,
+            "tokens_per_sec": self.tokens_per_sec,
+            "total": self.total_latency,
+        }
+
+def _build_chain(llm):
+    from langchain.prompts import PromptTemplate
+    prompt = PromptTemplate(input_variables=['question', "docs"], template=PROMPT_TEMPLATE)
+    return prompt | llm
+
+def _retrieve_context(db, query, k, cache, token_budget=None):
+    # Repeated questions skip both the embedding model and the ANN search
+    cache = cache or get_retrieval_cache()
+    docs = cache.similarity_search(db, query, k)
+    metrics.incr("retrieved_chunks", len(docs))
+
+    # Merge overlapping chunks and trim to the token budget to keep prefill short
+    from context_packer import pack_context
+    token_budget = token_budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", DEFAULT_CONTEXT_TOKENS))
+    context, report = pack_context(docs, token_budget)
+    metrics.incr("context_tokens", report["tokens_out"])
+    metrics.incr("context_tokens_saved", report["tokens_saved"])
+    metrics.event("context", **report)
+    return context
+
+def stream_response_from_query(db, query, k=4, llm=None, cache=None, stats=None, token_budget=None):
+    """
+    Yields the answer as the LLM generates it. Pass an AnswerStats as stats to get
+    time-to-first-token, tokens/s and total latency once the generator is exhausted.
+    """
+    stats = stats if stats is not None else AnswerStats()
+    docspagecontent = _retrieve_context(db, query, k, cache, token_budget)
+    chain = _build_chain(llm or get_llm())
+    try:
+        for token in chain.stream({"question": query, "docs": docspagecontent}):
+            stats.record_token()
+            yield token.replace("\n", "")
+    finally:
+        stats.finish()
+        # The generator is suspended between tokens, so the LLM span is recorded from the stats
+        metrics.observe("llm", stats.total_latency, mode="stream")
+        if stats.time_to_first_token is not None:
+            metrics.observe("llm_first_token", stats.time_to_first_token)
+        metrics.incr("llm_tokens", stats.tokens)
+        metrics.event("answer", **stats.as_dict())
+
+def get_response_from_query(db, query, k=4, cache=None, llm=None, token_budget=None):
+    docspagecontent = _retrieve_context(db, query, k, cache, token_budget)
+    chain = _build_chain(llm or get_llm())
+    with metrics.span("llm", mode="invoke"):
+        response = chain.invoke({"question": query, "docs": docspagecontent})
     response = response.replace("\n", "")
     return response
 
@@ -95,6 +259,7 @@ def main():
     transcript_path = get_transcript_file_path(url)
     
     # Create transcript if it does not exist
+    from TranscriptFactory import TranscriptFactory
     if not os.path.exists(transcript_path):
         transcript_instance = TranscriptFactory.create_transcript(url)
         transcript_instance.save_transcript_to_file(transcript_path)
@@ -0,0 +1,80 @@
+import os
+import json
+import hashlib
+
+DEFAULT_MANIFEST_PATH = "ingest_manifest.json"
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Returns the sha256 of a file, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class IngestManifest:
+    """
+    Records the content hash of every ingested transcript and META file, and the
+    collection and video id it went into, so re-runs only touch files that changed.
+    """
+
+    def __init__(self, path: str = DEFAULT_MANIFEST_PATH):
+        self.path = path
+        self.entries = {}
+        self._mtime_ns = None
+        self.reload_if_changed()
+
+    def reload_if_changed(self) -> bool:
+        """
+        Re-reads the manifest file when another process (an ingest run) rewrote it. Returns True if it was reloaded.
+        """
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime_ns == self._mtime_ns:
+            return False
+        with open(self.path, "r") as file:
+            self.entries = json.load(file)
+        self._mtime_ns = mtime_ns
+        return True
+
+    @property
+    def base_dir(self) -> str:
+        # Entries are recorded relative to the directory ingest ran in, which holds the manifest
+        return os.path.dirname(os.path.abspath(self.path))
+
+    def resolve(self, file_path: str) -> str:
+        return os.path.normpath(os.path.join(self.base_dir, file_path))
+
+    def _key(self, file_path: str) -> str:
+        return os.path.normpath(file_path)
+
+    def get(self, file_path: str):
+        return self.entries.get(self._key(file_path))
+
+    def is_unchanged(self, file_path: str, collection_name: str, content_hash: str) -> bool:
+        entry = self.get(file_path)
+        return bool(entry) and entry["hash"] == content_hash and entry["collection"] == collection_name
+
+    def record(self, file_path: str, collection_name: str, video_id: str, content_hash: str):
+        self.entries[self._key(file_path)] = {
+            "hash": content_hash,
+            "collection": collection_name,
+            "id": video_id,
+            "mtime": os.path.getmtime(file_path),
+        }
+
+    def remove(self, file_path: str):
+        self.entries.pop(self._key(file_path), None)
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.entries, file, indent=4)
+        os.replace(tmp_path, self.path)
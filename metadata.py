@@ -2,17 +2,27 @@ import os
 import ast
 import json
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from pymilvus import FieldSchema, DataType
-from sentence_transformers import SentenceTransformer
-from vectordb import MilvusVectorDB
+import metrics
+from embedding import generate_embeddings
+from chunker import split_text_into_documents as split_text
+from catalog import MetadataCatalog
+from manifest import IngestManifest, DEFAULT_MANIFEST_PATH
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from vectordb import MilvusVectorDB
+
+# Shared catalog of transcripts/META_*.json used to hydrate search results
+_default_catalog = None
 
 def read_metadata(metadata_path: str):
     with open(metadata_path, "r") as file:
         metadata = json.load(file)
     return metadata
 
-def create_metadata_collection(milvus_db: MilvusVectorDB, collection_name: str):
+def create_metadata_collection(milvus_db: "MilvusVectorDB", collection_name: str):
+    from pymilvus import FieldSchema, DataType
+
     dim = 384  # Update dimension to match all-MiniLM-L6-v2
     fields = [
         FieldSchema(name="pk", dtype=DataType.VARCHAR, is_primary=True, auto_id=True, max_length=100),
@@ -66,8 +76,8 @@ def construct_metadata_entities(documents):
 
     return entities
 
-def process_metadata_file(metadata_path, embeddings, expected_dim, milvus_db, collection_name):
-    print("In process_metadata:", metadata_path)
+def process_metadata_file(metadata_path, embeddings, expected_dim, milvus_db, collection_name, keyword_index=None):
+    metrics.event("process_metadata", path=metadata_path)
     metadata = read_metadata(metadata_path)
     
     description = metadata['description']
@@ -76,6 +86,8 @@ def process_metadata_file(metadata_path, embeddings, expected_dim, milvus_db, co
     
     # Split text into documents
     metadata_documents = split_text_into_documents(description, metadata_copy)
+    if keyword_index is not None:
+        keyword_index.add_documents(metadata_documents, collection_name, extra_fields=("title",))
     
     # Generate embeddings for documents
     meta_embedded_documents = generate_embeddings(metadata_documents, embeddings, expected_dim, text_field_name="description")
@@ -85,39 +97,32 @@ def process_metadata_file(metadata_path, embeddings, expected_dim, milvus_db, co
     
     # Insert documents into Milvus
     milvus_db.insert(collection_name, entities)
-    print(f"Inserted documents from {metadata_path} into collection '{collection_name}'")
+    metrics.event("inserted", path=metadata_path, collection=collection_name, rows=len(meta_embedded_documents))
 
 def split_text_into_documents(text: str, metadata: dict):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1024, chunk_overlap=20, length_function=len, is_separator_regex=False)
-    split_docs = text_splitter.split_documents([Document(page_content=text, metadata=metadata)])
-    return split_docs
+    return split_text(text, metadata)
 
-def generate_embeddings(documents, embeddings_model, expected_dim, text_field_name):
-    for doc in documents:
-        # Store the original text in the specified field of the metadata
-        doc.metadata[text_field_name] = doc.page_content
-        
-        # Generate embeddings for the document content
-        embedding = embeddings_model.encode([doc.page_content])[0]
-        # Ensure the embeddings are in the correct format (list of floats) and dimension
-        if isinstance(embedding, str):
-            embedding = json.loads(embedding)
-        if len(embedding) != expected_dim:
-            raise ValueError(f"Embedding dimension {len(embedding)} does not match expected dimension {expected_dim}")
-        doc.page_content = embedding
-    return documents
+def get_default_catalog():
+    global _default_catalog
+    if _default_catalog is None:
+        # The manifest adds META files ingested from other directories; it is re-read when ingest rewrites it
+        manifest = IngestManifest(DEFAULT_MANIFEST_PATH)
+        _default_catalog = MetadataCatalog(os.path.join(os.path.dirname(__file__), "transcripts"), manifest=manifest)
+    return _default_catalog
 
 def search_metadata(milvus_db, collection_name, data, 
-                    embeddings_model, topk=10, output_fields=None, text=True, expr="" , params=None):
+                    embeddings_model, topk=10, output_fields=None, text=True, expr="" , params=None, catalog=None):
     
-    description_embedding = embeddings_model.encode(data)
+    with metrics.span("embed", kind="query"):
+        description_embedding = embeddings_model.encode(data)
    
     # Build the query based on the provided conditions 
     if params == None:
+        # Range search: for L2, Milvus keeps hits with range_filter <= distance < radius
         search_params = {"metric_type": "L2",
                         "params": {
-                            "radius": 0.6,
-                            "range_filter":1.0
+                            "radius": 1.0,
+                            "range_filter": 0.0
                             }
                         }
     else:
@@ -129,6 +134,11 @@ def search_metadata(milvus_db, collection_name, data,
     if "embeddings" in output_fields and text:
         if "title" not in output_fields:
             output_fields.append("title")
+        # Hydration looks the description up by id, which unlike the title is unique
+        if "id" not in output_fields:
+            output_fields.append("id")
+        if catalog is None:
+            catalog = get_default_catalog()
      
     try:
         results = milvus_db.search(collection_name, 
@@ -136,7 +146,7 @@ def search_metadata(milvus_db, collection_name, data,
                                    params=search_params,
                                    expr=expr,
                                    output_fields=output_fields,
-                                   topk=10)
+                                   topk=topk)
     except ValueError as e:
         print(f"Failed to perform search on collection '{collection_name}': {e}")
         return []
@@ -149,43 +159,37 @@ def search_metadata(milvus_db, collection_name, data,
 
     # If 'embeddings' is in output_fields and text is True, replace embeddings with actual text
     if "embeddings" in output_fields and text:
-        for result in results:
-            i=0
-            for hit in result:
-                metadata = {} 
-                metadata['distance'] = results[0].distances[i]
-                i+=1
+        with metrics.span("hydrate", source="metadata"):
+            for result in results:
+                i=0
+                for hit in result:
+                    metadata = {} 
+                    metadata['distance'] = result.distances[i]
+                    i+=1
       
-                for field in output_fields:
-                    if field == "embeddings":
-                        # Construct the file name from the title field
-                        title = hit.entity.get("title")
-                   
-                        if title:
-                            metadata['title'] = title
-                            metadata_file_path = os.path.join(os.path.dirname(__file__), 
-                                                            "transcripts", f"META_{title}.json") 
-                            if os.path.exists(metadata_file_path):
-                                with open(metadata_file_path, "r") as file:
-                                    metadata_content = json.load(file)
-                                    description = metadata_content.get("description", "")
-                                    metadata[field] = description
+                    for field in output_fields:
+                        if field == "embeddings":
+                            title = hit.entity.get("title")
+                            if title:
+                                metadata['title'] = title
+
+                            metadata_content = catalog.get(hit.entity.get("id"))
+                            if metadata_content is not None:
+                                metadata[field] = metadata_content.get("description", "")
                             else:
                                 metadata[field] = "Metadata file not found"
                         else:
-                            metadata[field] = "Title not found"
-                    else:
-                        try:
-                            metadata[field] = hit.entity.get(field)
-                        except Exception as e:
-                            print("Field ", field, "Not found in the metadata...")
+                            try:
+                                metadata[field] = hit.entity.get(field)
+                            except Exception as e:
+                                print("Field ", field, "Not found in the metadata...")
                   
 
-                description = None
-                if "embeddings" in metadata:
-                    description = metadata['embeddings'] 
-                    del metadata['embeddings'] 
+                    description = None
+                    if "embeddings" in metadata:
+                        description = metadata['embeddings'] 
+                        del metadata['embeddings'] 
 
-                documents.append(Document(page_content=description, metadata=metadata))
+                    documents.append(Document(page_content=description, metadata=metadata))
     
     return documents
\ No newline at end of file
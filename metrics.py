@@ -0,0 +1,224 @@
+"""
+Timed spans and counters for the ingest and query paths. Off unless YTA_METRICS=1 or enable() is
+called; YTA_METRICS_JSONL=<path> also streams spans and events as JSON lines.
+"""
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+
+# Upper bounds in seconds of the span duration histogram buckets
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROMETHEUS_PREFIX = "yta"
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+_sink = None
+_counters = {}  # (name, labels) -> value
+_spans = {}  # (name, labels) -> [count, total seconds, max seconds, bucket counts]
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def enable(jsonl_path: str = None):
+    """
+    Starts recording. With jsonl_path, every finished span and every event is also appended there as a JSON line.
+    """
+    global _enabled, _sink
+    with _lock:
+        if _sink is not None:
+            _sink.close()
+        _sink = open(jsonl_path, "a", buffering=1) if jsonl_path else None
+        _enabled = True
+
+def disable():
+    global _enabled, _sink
+    with _lock:
+        _enabled = False
+        if _sink is not None:
+            _sink.close()
+            _sink = None
+
+def is_enabled() -> bool:
+    return _enabled
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _spans.clear()
+
+def _write(record: dict):
+    if _sink is None:
+        return
+    line = json.dumps(record, default=str)
+    with _lock:
+        if _sink is not None:
+            _sink.write(line + "\n")
+
+def incr(name: str, value: float = 1, **labels):
+    """
+    Adds value to the counter name{labels}, e.g. incr("bytes", 512, stage="fetch").
+    """
+    if not _enabled:
+        return
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def event(name: str, **fields):
+    """
+    Writes a one-off record (what used to be a progress print) to the JSON-lines sink.
+    """
+    if not _enabled:
+        return
+    _write({"type": "event", "name": name, "ts": time.time(), "fields": fields})
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **labels):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class Span:
+    """
+    Times a block. Nested spans record their parent's name, so a JSON-lines trace can be read as a tree.
+    """
+    __slots__ = ("name", "labels", "fields", "parent", "start")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+        self.fields = {}
+        self.parent = None
+        self.start = 0.0
+
+    def set(self, **fields):
+        """
+        Attaches extra fields (e.g. rows=...) to the span's JSON-lines record.
+        """
+        self.fields.update(fields)
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        _local.stack.pop()
+        _record(self.name, self.labels, elapsed, self.parent, self.fields,
+                exc_type.__name__ if exc_type is not None else None)
+        return False
+
+def _record(name: str, labels: dict, elapsed: float, parent: str = None, fields: dict = None, error: str = None):
+    key = (name, _label_key(labels))
+    with _lock:
+        stats = _spans.get(key)
+        if stats is None:
+            stats = _spans[key] = [0, 0.0, 0.0, [0] * (len(DURATION_BUCKETS) + 1)]
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+        stats[3][bisect_left(DURATION_BUCKETS, elapsed)] += 1
+    if _sink is not None:
+        record = {"type": "span", "name": name, "ts": time.time(), "duration_ms": elapsed * 1000.0,
+                  "labels": labels, "parent": parent}
+        if fields:
+            record["fields"] = fields
+        if error:
+            record["error"] = error
+        _write(record)
+
+def observe(name: str, seconds: float, **labels):
+    """
+    Records a span whose duration was measured elsewhere, e.g. a streamed LLM answer.
+    """
+    if not _enabled:
+        return
+    _record(name, labels, seconds)
+
+def span(name: str, **labels):
+    """
+    Context manager timing one stage:
+
+        with metrics.span("embed", model="minilm") as s:
+            ...
+            s.set(texts=len(texts))
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name, labels)
+
+def snapshot() -> dict:
+    """
+    Returns {"counters": {...}, "spans": {...}} keyed by name{label=value,...}.
+    """
+    def render(name, labels):
+        return name if not labels else name + "{" + ",".join(f"{key}={value}" for key, value in labels) + "}"
+
+    with _lock:
+        counters = {render(name, labels): value for (name, labels), value in _counters.items()}
+        spans = {render(name, labels): {"count": count, "total_ms": total * 1000.0, "max_ms": longest * 1000.0,
+                                        "mean_ms": total * 1000.0 / count}
+                 for (name, labels), (count, total, longest, _) in _spans.items()}
+    return {"counters": counters, "spans": spans}
+
+def _prometheus_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+def to_prometheus() -> str:
+    """
+    Renders counters as <prefix>_<name>_total and spans as the <prefix>_span_seconds histogram.
+    """
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        spans = sorted(_spans.items())
+
+    declared = set()
+    for (name, labels), value in counters:
+        metric = f"{PROMETHEUS_PREFIX}_{name}_total"
+        if metric not in declared:
+            lines.append(f"# TYPE {metric} counter")
+            declared.add(metric)
+        lines.append(f"{metric}{_prometheus_labels(labels)} {value}")
+
+    if spans:
+        metric = f"{PROMETHEUS_PREFIX}_span_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for (name, labels), (count, total, _, buckets) in spans:
+            labels = (("span", name),) + labels
+            cumulative = 0
+            for bound, bucket in zip(DURATION_BUCKETS + ("+Inf",), buckets):
+                cumulative += bucket
+                lines.append(f"{metric}_bucket{_prometheus_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{metric}_sum{_prometheus_labels(labels)} {total}")
+            lines.append(f"{metric}_count{_prometheus_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path: str):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        file.write(to_prometheus())
+    os.replace(tmp_path, path)
+
+if os.getenv("YTA_METRICS", "").lower() in ("1", "true", "yes"):
+    enable(os.getenv("YTA_METRICS_JSONL") or None)
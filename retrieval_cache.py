@@ -0,0 +1,131 @@
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+import metrics
+
+DEFAULT_MAX_QUERIES = 1024
+DEFAULT_MAX_RESULTS = 4096
+DEFAULT_TTL = 3600.0
+
+class TTLCache:
+    """
+    A size-bounded LRU whose entries also expire ttl seconds after they were stored.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str = "ttl"):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                metrics.incr("cache_hits", cache=self.name)
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            metrics.incr("cache_misses", cache=self.name)
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+def index_checksum(db) -> str:
+    """
+    Identifies the current contents of an index. A `checksum` attribute (the transcript md5 that
+    langchainhelper names the db after) is combined with the vector count, so adding or removing
+    vectors changes the key and stale entries are never served.
+    """
+    checksum = getattr(db, "checksum", None) or f"obj{id(db)}"
+    ntotal = getattr(getattr(db, "index", None), "ntotal", "")
+    return f"{checksum}:{ntotal}"
+
+def embeddings_key(embeddings) -> tuple:
+    """
+    Identifies an embeddings model by name and dimension, as EmbeddingCache does, so that a new
+    object reusing a collected one's id() never picks up its cached query vectors.
+    """
+    name = getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None)
+    if not isinstance(name, str):
+        name = f"{type(embeddings).__module__}.{type(embeddings).__qualname__}"
+    return name, getattr(embeddings, "dim", None)
+
+class RetrievalCache:
+    """
+    Two-level cache in front of similarity search:
+      1. query text -> query embedding, so repeated questions skip the embedding model;
+      2. (index checksum, query, k) -> retrieved docstore ids, so they also skip the ANN search.
+    """
+
+    def __init__(self, max_queries: int = DEFAULT_MAX_QUERIES, max_results: int = DEFAULT_MAX_RESULTS,
+                 ttl: float = DEFAULT_TTL):
+        self.embeddings = TTLCache(max_queries, ttl, "query_embedding")
+        self.results = TTLCache(max_results, ttl, "retrieval")
+
+    def embed_query(self, embeddings, query: str):
+        key = (embeddings_key(embeddings), query)
+        vector = self.embeddings.get(key)
+        if vector is None:
+            with metrics.span("embed", kind="query"):
+                vector = embeddings.embed_query(query)
+            self.embeddings.set(key, vector)
+        return vector
+
+    def similarity_search(self, db, query: str, k: int = 4):
+        """
+        Cached replacement for db.similarity_search(query, k) on a langchain FAISS store.
+        Other stores (e.g. a ShardManager) are searched directly and cache their documents.
+        """
+        key = (index_checksum(db), query, k)
+        cached = self.results.get(key)
+
+        if not hasattr(db, "index_to_docstore_id"):
+            if cached is None:
+                with metrics.span("search", backend=type(db).__name__):
+                    cached = db.similarity_search(query, k)
+                self.results.set(key, cached)
+            return cached
+
+        if cached is None:
+            vector = np.asarray([self.embed_query(db.embeddings, query)], dtype=np.float32)
+            if getattr(db, "_normalize_L2", False):
+                vector /= np.linalg.norm(vector, axis=1, keepdims=True)
+            with metrics.span("search", backend="faiss"):
+                _, positions = db.index.search(vector, k)
+            cached = [db.index_to_docstore_id[position] for position in positions[0] if position != -1]
+            self.results.set(key, cached)
+        return [db.docstore.search(docstore_id) for docstore_id in cached]
+
+    def stats(self) -> dict:
+        return {
+            "embedding_hits": self.embeddings.hits,
+            "embedding_misses": self.embeddings.misses,
+            "result_hits": self.results.hits,
+            "result_misses": self.results.misses,
+            "embedding_entries": len(self.embeddings),
+            "result_entries": len(self.results),
+        }
+
+    def clear(self):
+        self.embeddings.clear()
+        self.results.clear()
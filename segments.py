@@ -0,0 +1,134 @@
+import os
+import struct
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+
+SEGMENT_FILE_MAGIC = b"SEG1"
+SEGMENT_FILE_SUFFIX = ".seg"
+
+def _piece_field(piece, name):
+    # youtube_transcript_api returns dicts in older releases and snippet objects in newer ones
+    return piece[name] if isinstance(piece, dict) else getattr(piece, name)
+
+class SegmentIndex:
+    """
+    Maps transcript character offsets to video time and back.
+
+    Segments are stored as three parallel arrays (char offset, start seconds, duration),
+    20 bytes per segment, and both directions are answered by binary search.
+    """
+
+    def __init__(self, offsets=None, starts=None, durations=None):
+        self.offsets = array("q", offsets or [])
+        self.starts = array("d", starts or [])
+        self.durations = array("f", durations or [])
+
+    @classmethod
+    def from_pieces(cls, pieces, separator: str = " "):
+        """
+        Joins transcript pieces the way download_youtube_transcript does and returns (text, index).
+        """
+        index = cls()
+        parts = []
+        offset = 0
+        for i, piece in enumerate(pieces):
+            text = _piece_field(piece, "text")
+            if i:
+                offset += len(separator)
+            index.offsets.append(offset)
+            index.starts.append(float(_piece_field(piece, "start")))
+            index.durations.append(float(_piece_field(piece, "duration")))
+            parts.append(text)
+            offset += len(text)
+        return separator.join(parts), index
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def segment_at_char(self, char_offset: int) -> int:
+        return max(0, bisect_right(self.offsets, char_offset) - 1)
+
+    def char_to_time(self, char_offset: int) -> float:
+        """
+        Returns the start time in seconds of the segment containing char_offset.
+        """
+        if not len(self):
+            return 0.0
+        return self.starts[self.segment_at_char(char_offset)]
+
+    def time_to_char(self, seconds: float) -> int:
+        """
+        Returns the char offset of the segment playing at `seconds`.
+        """
+        if not len(self):
+            return 0
+        return self.offsets[max(0, bisect_right(self.starts, seconds) - 1)]
+
+    def chunk_by_time(self, text: str, window_seconds: float, overlap_seconds: float = 0.0):
+        """
+        Yields (chunk_text, start_char, end_char, start_time, end_time) for consecutive time windows.
+        Chunk boundaries fall on segment boundaries; a window that adds no segment past the previous
+        chunk (e.g. inside a segment longer than the step) is skipped.
+        """
+        if not len(self) or window_seconds <= 0:
+            return
+        step = max(window_seconds - overlap_seconds, 1e-6)
+        last = len(self) - 1
+        window_start = self.starts[0]
+        end_of_video = self.starts[last] + self.durations[last]
+        previous_stop = 0
+        while window_start < end_of_video:
+            first = max(0, bisect_right(self.starts, window_start) - 1)
+            stop = bisect_right(self.starts, window_start + window_seconds - 1e-9)
+            stop = max(stop, first + 1)
+            if stop > previous_stop:
+                start_char = self.offsets[first]
+                end_char = self.offsets[stop] if stop <= last else len(text)
+                end_time = self.starts[stop - 1] + self.durations[stop - 1]
+                yield text[start_char:end_char].strip(), start_char, end_char, self.starts[first], end_time
+                previous_stop = stop
+            if stop > last:
+                return
+            # Always move past the window's first segment, so a long segment is not chunked again
+            window_start = max(window_start + step, self.starts[first + 1])
+
+    def save(self, path: str):
+        with open(path, "wb") as file:
+            file.write(SEGMENT_FILE_MAGIC)
+            file.write(struct.pack("<I", len(self)))
+            self.offsets.tofile(file)
+            self.starts.tofile(file)
+            self.durations.tofile(file)
+
+    @classmethod
+    def load(cls, path: str):
+        index = cls()
+        with open(path, "rb") as file:
+            if file.read(4) != SEGMENT_FILE_MAGIC:
+                raise ValueError(f"Not a segment index file: {path}")
+            (count,) = struct.unpack("<I", file.read(4))
+            index.offsets.fromfile(file, count)
+            index.starts.fromfile(file, count)
+            index.durations.fromfile(file, count)
+        return index
+
+def segment_index_path(transcript_path: str) -> str:
+    return os.path.splitext(transcript_path)[0] + SEGMENT_FILE_SUFFIX
+
+@lru_cache(maxsize=256)
+def _load_cached(path: str, mtime_ns: int):
+    return SegmentIndex.load(path)
+
+def load_segment_index(transcript_path: str):
+    """
+    Returns the SegmentIndex saved next to a transcript, or None if there is none.
+    """
+    path = segment_index_path(transcript_path)
+    try:
+        return _load_cached(path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+def deep_link(video_id: str, seconds: float) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}&t={int(seconds)}s"
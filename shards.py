@@ -0,0 +1,126 @@
+import os
+import heapq
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import metrics
+
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+DEFAULT_MAX_WORKERS = 8
+
+# Files written by langchain's FAISS.save_local
+SHARD_FILES = ("index.faiss", "index.pkl")
+
+class ShardManager:
+    """
+    Treats the per-video FAISS indexes under vdb/<md5> as shards of one corpus.
+
+    A query is embedded once and run against every shard on a thread pool, and the
+    per-shard top-k lists are merged by distance. Shards are loaded on first hit and
+    kept in an LRU bounded by memory_budget bytes (estimated from the on-disk size).
+    """
+
+    def __init__(self, embeddings, root: str = "vdb", memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 max_workers: int = DEFAULT_MAX_WORKERS):
+        self.embeddings = embeddings
+        self.root = root
+        self.memory_budget = memory_budget
+        self.max_workers = max_workers
+        self._loaded = OrderedDict()  # name -> (db, size)
+        self._loaded_bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}  # name -> Lock, so concurrent hits load a shard once
+        self.loads = 0
+        self.evictions = 0
+
+    def list_shards(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        # Require every save_local file: FAISSVectorDB collections under the same root have index.faiss but no index.pkl
+        return sorted(name for name in os.listdir(self.root)
+                      if all(os.path.exists(os.path.join(self.root, name, file)) for file in SHARD_FILES))
+
+    @property
+    def checksum(self) -> str:
+        """
+        Changes whenever a shard is added, removed or rewritten; used to key retrieval caches.
+        """
+        digest = hashlib.md5()
+        for name in self.list_shards():
+            path = os.path.join(self.root, name, SHARD_FILES[0])
+            digest.update(f"{name}:{os.path.getmtime(path)}:{os.path.getsize(path)};".encode())
+        return digest.hexdigest()
+
+    def shard_size(self, name: str) -> int:
+        path = os.path.join(self.root, name)
+        return sum(os.path.getsize(os.path.join(path, file)) for file in SHARD_FILES
+                   if os.path.exists(os.path.join(path, file)))
+
+    def get_shard(self, name: str):
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                return self._loaded[name][0]
+            loading = self._loading.setdefault(name, threading.Lock())
+
+        with loading:
+            with self._lock:
+                if name in self._loaded:
+                    self._loaded.move_to_end(name)
+                    return self._loaded[name][0]
+
+            from langchain_community.vectorstores import FAISS
+            with metrics.span("load_shard"):
+                db = FAISS.load_local(os.path.join(self.root, name), self.embeddings, allow_dangerous_deserialization=True)
+            size = self.shard_size(name)
+            metrics.incr("shard_loads")
+
+            with self._lock:
+                self._loaded[name] = (db, size)
+                self._loaded_bytes += size
+                self.loads += 1
+                # Evict least recently used shards, but never the one just loaded
+                while self._loaded_bytes > self.memory_budget and len(self._loaded) > 1:
+                    _, (_, evicted_size) = self._loaded.popitem(last=False)
+                    self._loaded_bytes -= evicted_size
+                    self.evictions += 1
+                self._loading.pop(name, None)
+            return db
+
+    def _search_shard(self, name: str, vector: List[float], k: int):
+        db = self.get_shard(name)
+        hits = db.similarity_search_with_score_by_vector(vector, k)
+        for doc, _ in hits:
+            doc.metadata.setdefault("shard", name)
+        return hits
+
+    def search(self, query: str, k: int = 4, shards: List[str] = None):
+        """
+        Returns the k (Document, distance) pairs closest to query across shards (all shards by default).
+        """
+        shards = self.list_shards() if shards is None else shards
+        if not shards:
+            return []
+        with metrics.span("embed", kind="query"):
+            vector = self.embeddings.embed_query(query)
+
+        with metrics.span("search", backend="shards") as span, \
+                ThreadPoolExecutor(max_workers=min(self.max_workers, len(shards))) as executor:
+            span.set(shards=len(shards))
+            per_shard = executor.map(lambda name: self._search_shard(name, vector, k), shards)
+            return heapq.nsmallest(k, (hit for hits in per_shard for hit in hits), key=lambda hit: hit[1])
+
+    def similarity_search(self, query: str, k: int = 4) -> list:
+        return [doc for doc, _ in self.search(query, k)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded_shards": len(self._loaded),
+                "loaded_bytes": self._loaded_bytes,
+                "memory_budget": self.memory_budget,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
@@ -1,16 +1,20 @@
 import os
-from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from pymilvus import FieldSchema, DataType
-from sentence_transformers import SentenceTransformer
-from vectordb import MilvusVectorDB
+from embedding import generate_embeddings
+import metrics
+from chunker import iter_file_documents, batched, split_text_into_documents as split_text
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from vectordb import MilvusVectorDB
 
 def read_transcript(transcript_path: str):
     with open(transcript_path, "r") as file:
         transcript = file.read()
     return transcript
 
-def create_transcript_collection(milvus_db: MilvusVectorDB, collection_name: str):
+def create_transcript_collection(milvus_db: "MilvusVectorDB", collection_name: str):
+    from pymilvus import FieldSchema, DataType
+
     dim = 384  # Update dimension to match all-MiniLM-L6-v2
     fields = [
         FieldSchema(name="pk", dtype=DataType.INT64, is_primary=True, auto_id=True),
@@ -25,47 +29,10 @@ def create_transcript_collection(milvus_db: MilvusVectorDB, collection_name: str
     milvus_db.create_collection(collection_name, fields)
 
 def split_text_into_documents(text: str, metadata: dict):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1024, chunk_overlap=20, length_function=len, is_separator_regex=False)
-    split_docs = []
-    start_offset = 0
-
-    for chunk in text_splitter.split_text(text):
-        end_offset = start_offset + len(chunk)
-        chunk_metadata = metadata.copy()
-        chunk_metadata["start"] = start_offset
-        chunk_metadata["end"] = end_offset
-        split_docs.append(Document(page_content=chunk, metadata=chunk_metadata))
-        start_offset = end_offset
-
-    return split_docs
-
-def generate_embeddings(documents, embeddings_model, expected_dim, text_field_name):
-    for doc in documents:
-        # Store the original text in the specified field of the metadata
-        doc.metadata[text_field_name] = doc.page_content
-        
-        # Generate embeddings for the document content
-        embedding = embeddings_model.encode([doc.page_content])[0]
-        # Ensure the embeddings are in the correct format (list of floats) and dimension
-        if isinstance(embedding, str):
-            embedding = json.loads(embedding)
-        if len(embedding) != expected_dim:
-            raise ValueError(f"Embedding dimension {len(embedding)} does not match expected dimension {expected_dim}")
-        doc.page_content = embedding
-    return documents
-
-def process_transcript_file(transcript_path, metadata, embeddings, expected_dim, milvus_db, collection_name):
-    print("In process_transcript:", transcript_path)
-    transcript = read_transcript(transcript_path)
-    
-    # Split text into documents with id, start, end, and transcript_path as metadata
-    metadata_copy = {"id": metadata["id"], "transcript_path": transcript_path}
-    transcript_documents = split_text_into_documents(transcript, metadata_copy)
-    
-    # Generate embeddings for documents
-    transcript_embedded_documents = generate_embeddings(transcript_documents, embeddings, expected_dim, text_field_name="text")
+    # start/end are exact character offsets into text, overlap included
+    return split_text(text, metadata)
 
-    # Construct entities for insertion
+def construct_transcript_entities(documents):
     entities = {
         "id": [],
         "start": [],
@@ -74,14 +41,42 @@ def process_transcript_file(transcript_path, metadata, embeddings, expected_dim,
         "embeddings": []
     }
     
-    for doc in transcript_embedded_documents:
+    for doc in documents:
         entities["id"].append(doc.metadata["id"])
         entities["start"].append(doc.metadata["start"])
         entities["end"].append(doc.metadata["end"])
         entities["transcript_path"].append(doc.metadata["transcript_path"])  # Add transcript_path field
         entities["embeddings"].append(doc.page_content)
+
+    return entities
+
+def process_transcript_file(transcript_path, metadata, embeddings, expected_dim, milvus_db, collection_name,
+                            batch_size: int = 1024, keyword_index=None, dedup_index=None):
+    metrics.event("process_transcript", path=transcript_path)
+    
+    # Stream documents with id, start, end, and transcript_path as metadata, batch_size chunks at a time
+    metadata_copy = {"id": metadata["id"], "transcript_path": transcript_path}
+    total = 0
+    for transcript_documents in batched(iter_file_documents(transcript_path, metadata_copy), batch_size):
+        if keyword_index is not None:
+            keyword_index.add_documents(transcript_documents, collection_name)
+        if dedup_index is not None:
+            transcript_documents = dedup_index.filter_documents(transcript_documents, collection_name)
+            if not transcript_documents:
+                continue
+
+        # Generate embeddings for documents
+        transcript_embedded_documents = generate_embeddings(transcript_documents, embeddings, expected_dim, text_field_name="text")
+
+        # Construct entities for insertion
+        entities = construct_transcript_entities(transcript_embedded_documents)
+
+        # Insert documents into Milvus
+        milvus_db.insert(collection_name, entities, flush=False)
+        total += len(transcript_embedded_documents)
+    milvus_db.flush(collection_name)
     
-    print("Number of transcript embedded documents...", len(transcript_embedded_documents))
-    # Insert documents into Milvus
-    milvus_db.insert(collection_name, entities)
-    print(f"Inserted documents from {transcript_path} into collection '{collection_name}'")
+    metrics.incr("chunks", total)
+    if metrics.is_enabled():
+        metrics.incr("bytes", os.path.getsize(transcript_path), stage="ingest")
+    metrics.event("inserted", path=transcript_path, collection=collection_name, rows=total)
@@ -0,0 +1,133 @@
+import os
+import mmap
+import threading
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_MAX_OPEN = 32
+CHECKPOINT_CHARS = 4096
+SCAN_BLOCK_BYTES = 1 << 20
+
+def _char_starts(data) -> np.ndarray:
+    # Positions of the first byte of every UTF-8 character (anything that is not a 10xxxxxx continuation byte)
+    return np.flatnonzero((data & 0xC0) != 0x80)
+
+class MappedTranscript:
+    """
+    A read-only memory map over one UTF-8 transcript file.
+
+    Offsets stored in Milvus are character offsets into the decoded text. ASCII files map
+    them to bytes directly; other files keep the byte offset of every CHECKPOINT_CHARS-th
+    character and walk forward from the nearest checkpoint.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        stat = os.stat(path)
+        self.signature = (stat.st_size, stat.st_mtime_ns)
+        self.size = stat.st_size
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.checkpoints = None
+        self.length = 0
+        self._index()
+
+    def _index(self):
+        if not self.size:
+            return
+        data = np.frombuffer(self._map, dtype=np.uint8)
+        checkpoints = []
+        chars = 0
+        ascii_only = True
+        for block_start in range(0, self.size, SCAN_BLOCK_BYTES):
+            block = data[block_start:block_start + SCAN_BLOCK_BYTES]
+            if ascii_only and block.max() < 0x80:
+                starts = None
+                count = len(block)
+            else:
+                if ascii_only:
+                    # First non-ASCII block: backfill checkpoints for the ASCII prefix
+                    ascii_only = False
+                    checkpoints = list(range(0, block_start, CHECKPOINT_CHARS))
+                starts = _char_starts(block)
+                count = len(starts)
+            if starts is not None:
+                first = (-chars) % CHECKPOINT_CHARS
+                checkpoints.extend((starts[first::CHECKPOINT_CHARS] + block_start).tolist())
+            chars += count
+        self.length = chars
+        self.checkpoints = None if ascii_only else np.asarray(checkpoints, dtype=np.int64)
+
+    def char_to_byte(self, char_offset: int) -> int:
+        char_offset = max(0, min(char_offset, self.length))
+        if self.checkpoints is None:
+            return char_offset
+        if char_offset == self.length:
+            return self.size
+
+        index, remainder = divmod(char_offset, CHECKPOINT_CHARS)
+        byte_offset = int(self.checkpoints[index])
+        if remainder == 0:
+            return byte_offset
+        # At most 4 bytes per character, so the target lies within this window
+        window_end = min(self.size, byte_offset + 4 * (remainder + 1))
+        # Copy the few window bytes: a view would export the map's buffer and make close() raise BufferError
+        window = np.frombuffer(self._map[byte_offset:window_end], dtype=np.uint8)
+        return byte_offset + int(_char_starts(window)[remainder])
+
+    def slice(self, start: int, end: int) -> str:
+        if not self.size or end <= start:
+            return ""
+        return self._map[self.char_to_byte(start):self.char_to_byte(end)].decode("utf-8")
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+class TranscriptStore:
+    """
+    Serves [start:end] character slices of transcript files from an LRU of open memory maps,
+    so repeated hits on the same transcript do not re-read the whole file.
+
+    Slices are read under the store's lock, so an eviction or a refresh of a changed file never
+    closes a map another thread is reading.
+    """
+
+    def __init__(self, max_open: int = DEFAULT_MAX_OPEN):
+        self.max_open = max_open
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, path: str) -> MappedTranscript:
+        # Called with the lock held; the map stays open until the caller releases it
+        stat = os.stat(path)
+        transcript = self._maps.get(path)
+        if transcript is not None and transcript.signature == (stat.st_size, stat.st_mtime_ns):
+            self._maps.move_to_end(path)
+            return transcript
+        if transcript is not None:
+            del self._maps[path]
+            transcript.close()
+
+        transcript = MappedTranscript(path)
+        self._maps[path] = transcript
+        while len(self._maps) > self.max_open:
+            _, evicted = self._maps.popitem(last=False)
+            evicted.close()
+        return transcript
+
+    def slice(self, path: str, start: int, end: int) -> str:
+        with self._lock:
+            return self._get(path).slice(start, end)
+
+    def slice_many(self, path: str, ranges):
+        with self._lock:
+            transcript = self._get(path)
+            return [transcript.slice(start, end) for start, end in ranges]
+
+    def close(self):
+        with self._lock:
+            for transcript in self._maps.values():
+                transcript.close()
+            self._maps.clear()
@@ -1,15 +1,39 @@
 # vectordb/__init__.py
-from sys import exit
-# Importing the necessary classes to expose them as part of the package API
-try:
-    from vectordb.base import MYVectorDB
-    print("Imported VectorDB from base.py")
-except ImportError as e:
-    print("Failed to import vectorDB: {e}",e)
-
- 
-from .faiss import FAISSVectorDB
-from .milvus import MilvusVectorDB
+import importlib
+import threading
+
+# Backends are imported on first use, so a FAISS-only worker never imports pymilvus and vice versa
+_BACKENDS = {
+    "MYVectorDB": ("vectordb.base", "MYVectorDB"),
+    "FAISSVectorDB": ("vectordb.faiss", "FAISSVectorDB"),
+    "MilvusVectorDB": ("vectordb.milvus", "MilvusVectorDB"),
+}
+
+# Short names accepted by get_backend()
+_ALIASES = {
+    "faiss": "FAISSVectorDB",
+    "milvus": "MilvusVectorDB",
+}
+
+_lock = threading.Lock()
+
+def get_backend(name: str):
+    """
+    Returns the backend class for "faiss", "milvus" or a class name, importing its module on first use.
+    """
+    name = _ALIASES.get(name.lower(), name)
+    if name not in _BACKENDS:
+        raise ValueError(f"Unsupported database type: {name}")
+    module_name, class_name = _BACKENDS[name]
+    with _lock:
+        backend = getattr(importlib.import_module(module_name), class_name)
+    globals()[name] = backend
+    return backend
+
+def __getattr__(name: str):
+    if name in _BACKENDS:
+        return get_backend(name)
+    raise AttributeError(f"module 'vectordb' has no attribute '{name}'")
 
 # Specifying what gets imported when someone does `from vectordb import *`
-__all__ = ["VectorDB", "FAISSVectorDB", "MilvusVectorDB"]
\ No newline at end of file
+__all__ = ["MYVectorDB", "FAISSVectorDB", "MilvusVectorDB", "get_backend"]
@@ -1,38 +1,330 @@
+import os
+import re
+import pickle
+import shutil
 from typing import List
+import numpy as np
+import faiss
 from langchain.schema import Document
-from langchain_community.vectorstores import FAISS
 from .base import MYVectorDB
+from embedding import encode_texts
+import metrics
+
+# Corpus sizes (number of vectors) at which the automatic index type changes
+FLAT_MAX_VECTORS = 10_000
+HNSW_MAX_VECTORS = 100_000
+
+# IVF training: faiss wants ~39 training points per centroid, and more than 256 per centroid is wasted
+MIN_POINTS_PER_CENTROID = 39
+MAX_POINTS_PER_CENTROID = 256
+
+# An explicit IVF collection stays Flat until it can train at least this many lists
+MIN_IVF_NLIST = 16
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.pkl"
+
+def choose_index_type(num_vectors: int) -> str:
+    """
+    Flat is exact and fastest to build for small corpora, HNSW gives the best latency for
+    medium ones, and IVF keeps memory and add/delete cost flat for large ones.
+    """
+    if num_vectors <= FLAT_MAX_VECTORS:
+        return "Flat"
+    if num_vectors <= HNSW_MAX_VECTORS:
+        return "HNSW"
+    return "IVF"
+
+def choose_nlist(num_vectors: int) -> int:
+    nlist = int(4 * np.sqrt(max(num_vectors, 1)))
+    # Never ask for more centroids than the training sample can support
+    return max(1, min(nlist, num_vectors // MIN_POINTS_PER_CENTROID))
+
+def parse_id_expr(expr: str) -> List[str]:
+    """
+    Accepts a plain id, 'id == "x"' or 'id in ["x", "y"]', the forms client.py uses with Milvus.
+    """
+    expr = expr.strip()
+    match = re.fullmatch(r'id\s*==\s*["\'](.*)["\']', expr)
+    if match:
+        return [match.group(1)]
+    match = re.fullmatch(r'id\s+in\s*\[(.*)\]', expr)
+    if match:
+        return re.findall(r'["\']([^"\']*)["\']', match.group(1))
+    return [expr]
+
+class FAISSCollection:
+    """
+    One ID-mapped FAISS index plus the documents behind its labels.
+    Every document gets an int64 label; labels are grouped by the document's `id`
+    metadata (the video id) so a whole video can be deleted at once.
+    """
+
+    def __init__(self, dim: int, index_type: str = "Flat", nlist: int = None, auto_index: bool = False):
+        self.dim = dim
+        self.index_type = index_type
+        self.auto_index = auto_index  # re-choose the index type as the collection grows
+        self.target_type = None  # requested type to rebuild into once there are enough vectors to train it
+        self.nlist = nlist
+        self.index = None
+        self.docs = {}
+        self.labels_by_id = {}
+        self.next_label = 0
+        self.deleted = set()  # HNSW cannot remove vectors, so its deletes are tombstones
+        self.read_only = False
+
+    def _build(self, index_type: str, train_vectors: np.ndarray = None):
+        if index_type == "Flat":
+            base = faiss.IndexFlatL2(self.dim)
+        elif index_type == "HNSW":
+            base = faiss.IndexHNSWFlat(self.dim, HNSW_M)
+            base.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            base.hnsw.efSearch = HNSW_EF_SEARCH
+        elif index_type == "IVF":
+            nlist = self.nlist or choose_nlist(len(train_vectors))
+            quantizer = faiss.IndexFlatL2(self.dim)
+            base = faiss.IndexIVFFlat(quantizer, self.dim, nlist, faiss.METRIC_L2)
+            sample = train_vectors
+            if len(sample) > nlist * MAX_POINTS_PER_CENTROID:
+                rows = np.random.default_rng(0).choice(len(sample), nlist * MAX_POINTS_PER_CENTROID, replace=False)
+                sample = sample[rows]
+            base.train(sample)
+            base.nprobe = max(1, nlist // 16)
+            self.nlist = nlist
+            self.index_type = index_type
+            # IVF stores labels itself; an IDMap2 wrapper would desync from it after remove_ids.
+            # The hashtable direct map lets vectors() reconstruct by label after deletes.
+            base.set_direct_map_type(faiss.DirectMap.Hashtable)
+            return base
+        else:
+            raise ValueError(f"Unsupported FAISS index type: {index_type}")
+        self.index_type = index_type
+        return faiss.IndexIDMap2(base)
+
+    def _base(self):
+        """
+        The index without its IDMap2 wrapper (IVF indexes are not wrapped).
+        """
+        index = faiss.downcast_index(self.index)
+        if isinstance(index, faiss.IndexIDMap2):
+            return faiss.downcast_index(index.index)
+        return index
+
+    @property
+    def ntotal(self) -> int:
+        return 0 if self.index is None else self.index.ntotal - len(self.deleted)
+
+    def vectors(self):
+        """
+        Returns (labels, vectors) for every live document, reconstructed from the index.
+        """
+        if self.index is None or self.index.ntotal == 0:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.dim), dtype=np.float32)
+        if not isinstance(faiss.downcast_index(self.index), faiss.IndexIDMap2):
+            # Unwrapped IVF: the live labels are the docstore's, looked up through the direct map
+            labels = np.fromiter(sorted(self.docs), dtype=np.int64, count=len(self.docs))
+            return labels, self.index.reconstruct_batch(labels)
+        base = self._base()
+        if isinstance(base, faiss.IndexIVF):
+            base.make_direct_map()
+        labels = faiss.vector_to_array(self.index.id_map)
+        vectors = base.reconstruct_n(0, self.index.ntotal)
+        live = np.array([label not in self.deleted for label in labels], dtype=bool)
+        return labels[live], vectors[live]
+
+    def add(self, vectors: np.ndarray, documents: List[Document]):
+        if self.index is None:
+            if self.index_type == "IVF" and len(vectors) < self._ivf_min_vectors():
+                # Too few vectors to train centroids yet; stay exact until the IVF can be trained
+                self.index = self._build("Flat")
+                self.target_type = "IVF"
+            else:
+                self.index = self._build(self.index_type, vectors)
+
+        labels = np.arange(self.next_label, self.next_label + len(vectors), dtype=np.int64)
+        self.next_label += len(vectors)
+        self.index.add_with_ids(vectors, labels)
+        for label, doc in zip(labels.tolist(), documents):
+            video_id = doc.metadata.get("id")
+            self.docs[label] = doc
+            self.labels_by_id.setdefault(video_id, []).append(label)
+        if self.target_type is not None and self.ntotal >= self._ivf_min_vectors():
+            self.rebuild(self.target_type, self.nlist)
+        return labels
+
+    def _ivf_min_vectors(self) -> int:
+        return (self.nlist or MIN_IVF_NLIST) * MIN_POINTS_PER_CENTROID
+
+    def remove(self, video_ids: List[str]) -> int:
+        labels = []
+        for video_id in video_ids:
+            labels.extend(self.labels_by_id.pop(video_id, []))
+        if not labels:
+            return 0
+        for label in labels:
+            self.docs.pop(label, None)
+        if isinstance(self._base(), faiss.IndexHNSW):
+            self.deleted.update(labels)
+        else:
+            self.index.remove_ids(np.asarray(labels, dtype=np.int64))
+        return len(labels)
+
+    def rebuild(self, index_type: str = None, nlist: int = None):
+        """
+        Re-creates the index with index_type (chosen by size when None), training on the current vectors.
+        """
+        labels, vectors = self.vectors()
+        self.nlist = nlist
+        self.index = self._build(index_type or choose_index_type(len(vectors)), vectors)
+        self.target_type = None
+        self.deleted.clear()
+        if len(vectors):
+            self.index.add_with_ids(vectors, labels)
+
+    def search(self, vectors: np.ndarray, k: int):
+        if self.index is None or self.index.ntotal == 0:
+            return [[] for _ in range(len(vectors))]
+        fetch = min(self.index.ntotal, k + len(self.deleted))
+        distances, labels = self.index.search(vectors, fetch)
+        results = []
+        for row_distances, row_labels in zip(distances, labels):
+            hits = [(self.docs[int(label)], float(distance)) for distance, label in zip(row_distances, row_labels)
+                    if label != -1 and int(label) in self.docs]
+            results.append(hits[:k])
+        return results
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        faiss.write_index(self.index, os.path.join(path, INDEX_FILE))
+        state = {key: value for key, value in self.__dict__.items() if key not in ("index", "read_only")}
+        with open(os.path.join(path, DOCSTORE_FILE), "wb") as file:
+            pickle.dump(state, file)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True):
+        with open(os.path.join(path, DOCSTORE_FILE), "rb") as file:
+            state = pickle.load(file)
+        collection = cls(state["dim"])
+        collection.__dict__.update(state)
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        collection.index = faiss.read_index(os.path.join(path, INDEX_FILE), flags)
+        collection.read_only = mmap
+        return collection
 
 class FAISSVectorDB(MYVectorDB):
-    def __init__(self, embeddings):
+    """
+    Native FAISS backend. Each collection is an ID-mapped Flat, IVF or HNSW index stored
+    under root/<collection_name>. Documents are embedded with the `embeddings` model and
+    grouped by their `id` metadata, so delete() removes one video without a rebuild.
+    """
+
+    def __init__(self, embeddings, root: str = "vdb", expected_dim: int = None):
         self.embeddings = embeddings
-        self.db = None
+        self.root = root
+        self.expected_dim = expected_dim
+        self.collections = {}
 
-    def create_collection(self, collection_name: str, schema: dict):
-        # FAISS does not support collections, so this method is not applicable
-        pass
+    def _path(self, collection_name: str) -> str:
+        return os.path.join(self.root, collection_name)
 
-    def insert(self, collection_name: str, documents: List[Document]):
-        self.db = FAISS.from_documents(documents, self.embeddings)
+    def get_collection(self, collection_name: str) -> FAISSCollection:
+        if collection_name not in self.collections:
+            if os.path.exists(os.path.join(self._path(collection_name), INDEX_FILE)):
+                self.load(collection_name)
+            else:
+                raise ValueError(f"Collection '{collection_name}' does not exist.")
+        return self.collections[collection_name]
 
-    def query(self, collection_name: str, query: str, k: int):
-        return self.db.similarity_search(query, k)
+    def _writable(self, collection_name: str) -> FAISSCollection:
+        collection = self.get_collection(collection_name)
+        if collection.read_only:
+            # Indexes loaded with IO_FLAG_MMAP are read-only; load a private copy before changing it
+            collection = FAISSCollection.load(self._path(collection_name), mmap=False)
+            self.collections[collection_name] = collection
+        return collection
 
-    def create_index(self, collection_name: str, index_params: dict):
-        # FAISS automatically creates an index, so this method is not applicable
-        pass
+    def create_collection(self, collection_name: str, schema: dict = None):
+        """
+        schema may set "dim", "index_type" ("Flat", "IVF", "HNSW" or "auto"), "expected_size" and "nlist".
+        With "auto", the index type is chosen from expected_size.
+        """
+        if collection_name in self.collections or os.path.exists(self._path(collection_name)):
+            print(f"Collection '{collection_name}' already exists. Reusing it.")
+            self.get_collection(collection_name)
+            return
+        schema = schema or {}
+        index_type = schema.get("index_type", "auto")
+        auto_index = index_type == "auto"
+        if auto_index:
+            index_type = choose_index_type(schema.get("expected_size", 0))
+        self.collections[collection_name] = FAISSCollection(schema.get("dim", self.expected_dim),
+                                                            index_type, schema.get("nlist"), auto_index)
+
+    def _embed(self, texts: List[str], dim: int = None) -> np.ndarray:
+        return encode_texts(texts, self.embeddings, dim)
+
+    def insert(self, collection_name: str, documents: List[Document], vectors: np.ndarray = None):
+        if not documents:
+            return []
+        if collection_name not in self.collections and not os.path.exists(self._path(collection_name)):
+            self.create_collection(collection_name)
+        collection = self._writable(collection_name)
+        if vectors is None:
+            vectors = self._embed([doc.page_content for doc in documents], collection.dim)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if collection.dim is None:
+            collection.dim = vectors.shape[1]
+        with metrics.span("insert", backend="faiss", collection=collection_name):
+            labels = collection.add(vectors, documents)
+        metrics.incr("rows_inserted", len(documents), collection=collection_name)
+
+        # An automatically chosen exact index that outgrew its size class is retrained as the recommended type
+        if collection.auto_index and collection.index_type == "Flat" and choose_index_type(collection.ntotal) != "Flat":
+            print(f"Rebuilding collection '{collection_name}' as {choose_index_type(collection.ntotal)}")
+            collection.rebuild()
+        return labels
+
+    def train(self, collection_name: str, sample_texts: List[str] = None, index_type: str = None):
+        """
+        Rebuilds the index, training IVF centroids from the collection's vectors,
+        or from sample_texts when the collection is still empty.
+        """
+        collection = self._writable(collection_name)
+        if collection.ntotal == 0 and sample_texts:
+            sample = self._embed(sample_texts, collection.dim)
+            collection.dim = sample.shape[1]
+            collection.index = collection._build(index_type or collection.index_type, sample)
+            return
+        collection.rebuild(index_type)
+
+    def similarity_search_with_score(self, collection_name: str, query: str, k: int = 4):
+        collection = self.get_collection(collection_name)
+        vector = self._embed([query], collection.dim)
+        with metrics.span("search", backend="faiss", collection=collection_name):
+            return collection.search(vector, k)[0]
+
+    def query(self, collection_name: str, query: str, k: int):
+        return [doc for doc, _ in self.similarity_search_with_score(collection_name, query, k)]
 
-    def load(self, collection_name: str):
-        # FAISS loads the database from a local file
-        self.db = FAISS.load_local(collection_name, self.embeddings, allow_dangerous_deserialization=True)
+    def load(self, collection_name: str, mmap: bool = True):
+        # With mmap, FAISS maps an IVF index's inverted lists instead of reading them; Flat and HNSW
+        # indexes are still read into memory. Either way the collection is read-only until written to
+        self.collections[collection_name] = FAISSCollection.load(self._path(collection_name), mmap=mmap)
 
     def delete(self, collection_name: str, expr: str):
-        # FAISS does not support deletion, so this method is not applicable
-        pass
+        collection = self._writable(collection_name)
+        return collection.remove(parse_id_expr(expr))
 
     def drop_collection(self, collection_name: str):
-        # FAISS does not support collections, so this method is not applicable
-        pass
+        self.collections.pop(collection_name, None)
+        shutil.rmtree(self._path(collection_name), ignore_errors=True)
 
-    def save(self, dbname: str):
-        self.db.save_local(dbname)
+    def save(self, collection_name: str):
+        collection = self.get_collection(collection_name)
+        if collection.read_only:
+            return
+        collection.save(self._path(collection_name))
@@ -1,5 +1,7 @@
 import json
 import os
+import threading
+import numpy as np
 from typing import List
 from pymilvus import (
     connections,
@@ -11,16 +13,277 @@ from pymilvus import (
 from dotenv import load_dotenv
 from pymilvus import DataType, CollectionSchema, Collection, MilvusClient
 from pymilvus.exceptions import CollectionNotExistException
+from pymilvus.client.types import LoadState
+import metrics
 
 load_dotenv()
 
+DEFAULT_SEARCH_PARAMS = {"metric_type": "L2", "params": {"nprobe": 10}}
+
+# Comma-separated collections to load and warm up when a MilvusVectorDB is created
+WARM_COLLECTIONS_ENV = "MILVUS_WARM_COLLECTIONS"
+
+INDEX_TYPES = ("IVF_FLAT", "IVF_SQ8", "IVF_PQ", "HNSW")
+
+# Index type of collections without an entry in the index config
+DEFAULT_INDEX_TYPE = "IVF_FLAT"
+
+# Per-collection index settings: index_type (one of INDEX_TYPES or "auto"), metric_type,
+# expected_size (rows assumed when sizing a new, still empty collection), params (explicit
+# build params) and search_preset. JSON in MILVUS_INDEX_CONFIG is merged over these.
+# Transcript chunks dominate memory; IVF_SQ8 stores them in a quarter of IVF_FLAT's space.
+DEFAULT_INDEX_CONFIG = {
+    "transcript_collection": {"index_type": "IVF_SQ8"},
+}
+INDEX_CONFIG_ENV = "MILVUS_INDEX_CONFIG"
+DEFAULT_EXPECTED_SIZE = 100_000
+
+# Corpus sizes at which the "auto" index type moves to a more compact quantized index
+AUTO_SQ8_MIN_VECTORS = 1_000_000
+AUTO_PQ_MIN_VECTORS = 10_000_000
+
+# Milvus accepts 1..65536 IVF lists
+MIN_NLIST = 16
+MAX_NLIST = 65536
+
+# IVF_PQ sub-vectors of this many dimensions, 8 bits per code: 384-d float32 -> 48 bytes per vector
+PQ_DIMS_PER_SUBVECTOR = 8
+PQ_NBITS = 8
+
+HNSW_EF_CONSTRUCTION = 200
+
+# Server error code for a search or query on a released collection
+COLLECTION_NOT_LOADED_CODE = 101
+
+# Search-time presets, latency first. IVF probes a fraction of nlist; HNSW explores ef candidates.
+SEARCH_PRESETS = {
+    "latency": {"nprobe_fraction": 1 / 128, "min_nprobe": 4, "ef": 32},
+    "balanced": {"nprobe_fraction": 1 / 32, "min_nprobe": 8, "ef": 64},
+    "recall": {"nprobe_fraction": 1 / 8, "min_nprobe": 16, "ef": 256},
+}
+DEFAULT_SEARCH_PRESET = "balanced"
+SEARCH_PRESET_ENV = "MILVUS_SEARCH_PRESET"
+
+def choose_index_type(num_vectors: int) -> str:
+    """
+    IVF_FLAT is exact within the probed lists; beyond a million vectors SQ8 (4x smaller)
+    and then PQ (~32x smaller) keep the collection in query-node memory.
+    """
+    if num_vectors >= AUTO_PQ_MIN_VECTORS:
+        return "IVF_PQ"
+    if num_vectors >= AUTO_SQ8_MIN_VECTORS:
+        return "IVF_SQ8"
+    return "IVF_FLAT"
+
+def choose_nlist(num_vectors: int) -> int:
+    return max(MIN_NLIST, min(MAX_NLIST, int(round(np.sqrt(max(num_vectors, 1))))))
+
+def choose_pq_m(dim: int) -> int:
+    """
+    Number of PQ sub-quantizers: the largest divisor of dim giving at least PQ_DIMS_PER_SUBVECTOR dims each.
+    """
+    for m in range(max(1, dim // PQ_DIMS_PER_SUBVECTOR), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+def choose_index_params(index_type: str, num_vectors: int, dim: int, metric_type: str = "L2") -> dict:
+    """
+    Build params for index_type sized for num_vectors rows of dim dimensions.
+    """
+    if index_type == "auto":
+        index_type = choose_index_type(num_vectors)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported index type '{index_type}', expected one of {INDEX_TYPES} or 'auto'")
+    if index_type == "HNSW":
+        params = {"M": 16 if num_vectors < AUTO_SQ8_MIN_VECTORS else 32, "efConstruction": HNSW_EF_CONSTRUCTION}
+    else:
+        params = {"nlist": choose_nlist(num_vectors)}
+        if index_type == "IVF_PQ":
+            params.update({"m": choose_pq_m(dim), "nbits": PQ_NBITS})
+    return {"index_type": index_type, "metric_type": metric_type, "params": params}
+
+def preset_search_params(index_params: dict, preset: str = DEFAULT_SEARCH_PRESET, topk: int = 10) -> dict:
+    """
+    Search params for a collection indexed with index_params: nprobe for IVF indexes, ef for HNSW.
+    """
+    if preset not in SEARCH_PRESETS:
+        raise ValueError(f"Unknown search preset '{preset}', expected one of {tuple(SEARCH_PRESETS)}")
+    settings = SEARCH_PRESETS[preset]
+    build = index_params.get("params", {})
+    if index_params.get("index_type") == "HNSW":
+        params = {"ef": max(settings["ef"], topk)}
+    elif "nlist" in build:
+        nlist = int(build["nlist"])
+        params = {"nprobe": min(nlist, max(settings["min_nprobe"], int(round(nlist * settings["nprobe_fraction"]))))}
+    else:
+        params = dict(DEFAULT_SEARCH_PARAMS["params"])
+    return {"metric_type": index_params.get("metric_type", DEFAULT_SEARCH_PARAMS["metric_type"]), "params": params}
+
+def load_index_config(config: dict = None) -> dict:
+    merged = {name: dict(entry) for name, entry in DEFAULT_INDEX_CONFIG.items()}
+    overrides = json.loads(os.getenv(INDEX_CONFIG_ENV) or "{}")
+    for source in (overrides, config or {}):
+        for name, entry in source.items():
+            merged.setdefault(name, {}).update(entry)
+    return merged
+
+def is_not_loaded_error(e: MilvusException) -> bool:
+    return getattr(e, "code", None) == COLLECTION_NOT_LOADED_CODE or "not loaded" in str(e).lower()
+
+def _collection_dim(collection: Collection, anns_field: str = "embeddings") -> int:
+    field = next((field for field in collection.schema.fields if field.name == anns_field), None)
+    return field.params.get("dim") if field is not None else None
+
+def _collection_index_params(collection: Collection, anns_field: str = "embeddings") -> dict:
+    """
+    The build params of anns_field's index as {"index_type", "metric_type", "params"}, or None.
+    """
+    for index in collection.indexes:
+        if index.field_name == anns_field:
+            params = dict(index.params)
+            # Depending on the server, build params come nested (possibly as JSON) or flattened
+            build = params.pop("params", None)
+            if isinstance(build, str):
+                build = json.loads(build)
+            if build is None:
+                build = {key: value for key, value in params.items() if key not in ("index_type", "metric_type")}
+            build = {key: int(value) if isinstance(value, str) and value.isdigit() else value
+                     for key, value in build.items()}
+            return {"index_type": params.get("index_type"), "metric_type": params.get("metric_type", "L2"),
+                    "params": build}
+    return None
+
+class MilvusSession:
+    """
+    One connection and one MilvusClient per Milvus endpoint, shared by every MilvusVectorDB
+    in the process. It remembers which collections are loaded, so a collection is loaded
+    at most once instead of paying a load() round-trip on every request. A collection the
+    server released behind its back is dropped from that set with mark_unloaded().
+    """
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+
+    def __init__(self, host: str, port: str, alias: str = "default", token: str = ""):
+        self.host = host
+        self.port = port
+        self.alias = alias
+        self.loaded = set()
+        self._collections = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}  # per collection, so one slow load() does not block other collections
+        try:
+            connections.connect(alias, host=host, port=port)
+            print(f"Connected to Milvus at {host}:{port} with profile {alias}")
+            self.client = MilvusClient(uri=f"http://{host}:{port}", token=token)
+        except MilvusException as e:
+            print(f"Failed to connect to Milvus: {e}")
+            raise
+
+    @classmethod
+    def get(cls, host: str = None, port: str = None, alias: str = None, token: str = None) -> "MilvusSession":
+        """
+        Returns the shared session for host:port/alias (from MILVUS_HOST, MILVUS_PORT, MILVUS_PROFILE
+        and MILVUS_TOKEN by default), connecting on first use.
+        """
+        host = host or os.getenv("MILVUS_HOST", "localhost")
+        port = port or os.getenv("MILVUS_PORT", "19530")
+        alias = alias or os.getenv("MILVUS_PROFILE", "default")
+        token = token if token is not None else os.getenv("MILVUS_TOKEN", "")
+        key = (host, str(port), alias)
+        with cls._sessions_lock:
+            if key not in cls._sessions:
+                cls._sessions[key] = cls(host, port, alias, token)
+            return cls._sessions[key]
+
+    def has_collection(self, collection_name: str) -> bool:
+        return collection_name in self._collections or utility.has_collection(collection_name, using=self.alias)
+
+    def collection(self, collection_name: str, schema: CollectionSchema = None) -> Collection:
+        """
+        Returns the cached Collection handle, creating the collection when a schema is given.
+        """
+        with self._lock:
+            if collection_name not in self._collections:
+                self._collections[collection_name] = Collection(name=collection_name, schema=schema, using=self.alias)
+            return self._collections[collection_name]
+
+    def list_collections(self) -> List[str]:
+        return self.client.list_collections()
+
+    def ensure_loaded(self, collection_name: str) -> Collection:
+        """
+        Loads the collection into query nodes the first time it is needed; later calls cost nothing.
+        """
+        collection = self.collection(collection_name)
+        if collection_name in self.loaded:
+            return collection
+        with self._lock:
+            load_lock = self._load_locks.setdefault(collection_name, threading.Lock())
+        with load_lock:
+            if collection_name not in self.loaded:
+                # Another process may have loaded it already; only then is load() skipped entirely
+                if utility.load_state(collection_name, using=self.alias) != LoadState.Loaded:
+                    with metrics.span("load", backend="milvus", collection=collection_name):
+                        collection.load()
+                    metrics.incr("collection_loads", collection=collection_name)
+                with self._lock:
+                    self.loaded.add(collection_name)
+        return collection
+
+    def mark_unloaded(self, collection_name: str):
+        # The server released it (a restart, or release() from another client); load it again on next use
+        with self._lock:
+            self.loaded.discard(collection_name)
+
+    def release(self, collection_name: str):
+        with self._lock:
+            self.loaded.discard(collection_name)
+            collection = self._collections.get(collection_name)
+        if collection is not None:
+            collection.release()
+
+    def forget(self, collection_name: str):
+        with self._lock:
+            self.loaded.discard(collection_name)
+            self._collections.pop(collection_name, None)
+
+    def warm_up(self, collection_names: List[str], anns_field: str = "embeddings", search_params: dict = None):
+        """
+        Loads each collection and runs one dummy search, so the first real query does not pay
+        for loading segments or building search caches. search_params maps collection names to
+        the params to warm up with (DEFAULT_SEARCH_PARAMS otherwise).
+        """
+        for collection_name in collection_names:
+            if not self.has_collection(collection_name):
+                print(f"Cannot warm up '{collection_name}': collection does not exist.")
+                continue
+            collection = self.ensure_loaded(collection_name)
+            dim = _collection_dim(collection, anns_field)
+            if dim is None:
+                continue
+            params = (search_params or {}).get(collection_name, DEFAULT_SEARCH_PARAMS)
+            with metrics.span("warm_up", backend="milvus", collection=collection_name):
+                collection.search([[0.0] * dim], anns_field, params, limit=1)
+
 class MilvusVectorDB:
-    def __init__(self, embeddings):
+    def __init__(self, embeddings, warm_collections: List[str] = None, session: MilvusSession = None,
+                 index_config: dict = None, search_preset: str = None):
+        """
+        index_config overrides DEFAULT_INDEX_CONFIG per collection; search_preset ("latency",
+        "balanced" or "recall") applies to collections whose config does not name one.
+        """
         self.embeddings = embeddings
         self.collections = {}
-        self.client = None
-        self.connect()
-        self.load_existing_collections()
+        self.index_config = load_index_config(index_config)
+        self.search_preset = search_preset or os.getenv(SEARCH_PRESET_ENV, DEFAULT_SEARCH_PRESET)
+        self._index_params = {}  # collection name -> build params of its embeddings index
+        self.session = session or MilvusSession.get()
+        self.client = self.session.client
+        if warm_collections is None:
+            warm_collections = [name.strip() for name in os.getenv(WARM_COLLECTIONS_ENV, "").split(",") if name.strip()]
+        if warm_collections:
+            self.warm_up(warm_collections)
 
     def get_client(self, url, token):
         try:
@@ -34,97 +297,184 @@ class MilvusVectorDB:
             raise
 
     def connect(self):
-        host = os.getenv("MILVUS_HOST", "localhost")
-        port = os.getenv("MILVUS_PORT", "19530")
-        profile = os.getenv("MILVUS_PROFILE", "default")
-        try:
-            connections.connect(profile, host=host, port=port)
-            print(f"Connected to Milvus at {host}:{port} with profile {profile}")
-        except MilvusException as e:
-            print(f"Failed to connect to Milvus: {e}")
-            raise
+        # Connections are owned by the shared session; kept for existing callers
+        self.session = MilvusSession.get()
+        self.client = self.session.client
 
     def load_existing_collections(self):
         try:
-            collection_names = utility.list_collections()
-            for name in collection_names:
-                self.collections[name] = Collection(name=name)
+            for name in self.session.list_collections():
+                self.collections[name] = self.session.collection(name)
             print(f"Loaded existing collections: {list(self.collections.keys())}")
         except MilvusException as e:
             print(f"Failed to load existing collections: {e}")
             raise
 
     def get_collection(self, collection_name: str):
+        # Handles are created on first use instead of wrapping every collection at startup
         if collection_name not in self.collections:
-            raise ValueError(f"Collection '{collection_name}' does not exist.")
+            if not self.session.has_collection(collection_name):
+                raise ValueError(f"Collection '{collection_name}' does not exist.")
+            self.collections[collection_name] = self.session.collection(collection_name)
         return self.collections[collection_name]
 
-    def create_collection(self, collection_name: str, cschema):
-        if utility.has_collection(collection_name):
-            print(f"Collection '{collection_name}' already exists. Deleting it.")
-            utility.drop_collection(collection_name)
+    def _loaded_collection(self, collection_name: str):
+        self.get_collection(collection_name)
+        return self.session.ensure_loaded(collection_name)
+
+    def _call_loaded(self, collection_name: str, collection: Collection, call):
+        """
+        Returns call(collection). If the server released the collection since this process loaded
+        it, loads it again and retries once.
+        """
+        try:
+            return call(collection)
+        except MilvusException as e:
+            if not is_not_loaded_error(e):
+                raise
+            print(f"Collection '{collection_name}' was released by the server; loading it again.")
+            self.session.mark_unloaded(collection_name)
+            return call(self._loaded_collection(collection_name))
+
+    def _build_index_params(self, collection_name: str, num_vectors: int, dim: int, index_type: str = None) -> dict:
+        config = self.index_config.get(collection_name, {})
+        index_params = choose_index_params(index_type or config.get("index_type", DEFAULT_INDEX_TYPE),
+                                           num_vectors, dim, config.get("metric_type", "L2"))
+        if not index_type or index_type == config.get("index_type"):
+            index_params["params"].update(config.get("params", {}))
+        return index_params
+
+    def create_collection(self, collection_name: str, cschema, index_type: str = None, expected_size: int = None):
+        """
+        Creates the collection with an index from its index config (or index_type), sized for
+        expected_size rows; rebuild_index() re-sizes it once the real row count is known.
+        """
+        # Existing collections are reused, never dropped; re-ingest deletes and re-inserts rows by id
+        if self.session.has_collection(collection_name):
+            print(f"Collection '{collection_name}' already exists. Reusing it.")
+            self.collections[collection_name] = self.session.collection(collection_name)
+            return
         
         print("Creating new Collection!!!") 
         
-        index_params = {
-            "index_type": "IVF_FLAT",
-            "metric_type": "L2",
-            "params": {"nlist": 128},
-        } 
+        config = self.index_config.get(collection_name, {})
+        dim = next((field.params.get("dim") for field in cschema if field.name == "embeddings"), None)
+        index_params = self._build_index_params(collection_name,
+                                                expected_size or config.get("expected_size", DEFAULT_EXPECTED_SIZE),
+                                                dim, index_type)
         try:
             schema = CollectionSchema(fields=cschema,
                                       description="Metadata and embedding for weburl and youtube videos!")
-            self.collections[collection_name] = Collection(name=collection_name, schema=schema)       
+            self.collections[collection_name] = self.session.collection(collection_name, schema)
             print(f"Collection '{collection_name}' created successfully.")
             self.collections[collection_name].create_index(field_name="embeddings", index_params=index_params)
-            print(f"Index for Collection '{collection_name}' created successfully.")
+            self._index_params[collection_name] = index_params
+            print(f"Index {index_params} for Collection '{collection_name}' created successfully.")
             
         except MilvusException as e:
             print(f"Failed to create collection '{collection_name}': {e}", e)
             raise
 
-    def insert(self, collection_name: str, entities: dict):
+    def insert(self, collection_name: str, entities: dict, flush: bool = True):
         try:
             collection = self.get_collection(collection_name)
-            collection.insert([entities[field] for field in entities])
-            collection.flush()
-            print(f"Inserted documents into collection '{collection_name}'.")
+            rows = len(next(iter(entities.values()), []))
+            with metrics.span("insert", backend="milvus", collection=collection_name):
+                collection.insert([entities[field] for field in entities])
+            metrics.incr("rows_inserted", rows, collection=collection_name)
+            if flush:
+                with metrics.span("flush", backend="milvus", collection=collection_name):
+                    collection.flush()
         except MilvusException as e:
             print(f"Failed to insert documents into collection '{collection_name}': {e}")
             raise
 
-    def query(self, collection_name: str, query: str, k: int):
+    def flush(self, collection_name: str):
+        try:
+            with metrics.span("flush", backend="milvus", collection=collection_name):
+                self.get_collection(collection_name).flush()
+        except MilvusException as e:
+            print(f"Failed to flush collection '{collection_name}': {e}")
+            raise
+
+    def rebuild_index(self, collection_name: str, index_type: str = None, params: dict = None) -> dict:
+        """
+        Migrates the collection to a new embeddings index (index_type, or its configured type),
+        sized from the current row count. The collection is released while the index builds and
+        reloaded afterwards; rows are untouched. Returns the new index params.
+        """
         collection = self.get_collection(collection_name)
-        collection.load()
-        search_params = {
-            "metric_type": "L2",
-            "params": {"nprobe": 10},
-        }
-        return collection.search(query, "embeddings", search_params, limit=k)
+        self.flush(collection_name)
+        num_vectors = collection.num_entities
+        index_params = self._build_index_params(collection_name, num_vectors, _collection_dim(collection), index_type)
+        index_params["params"].update(params or {})
+        print(f"Rebuilding index of '{collection_name}' ({num_vectors} vectors) as {index_params}")
+
+        with metrics.span("rebuild_index", backend="milvus", collection=collection_name):
+            self.session.release(collection_name)
+            if collection.has_index():
+                collection.drop_index()
+            collection.create_index(field_name="embeddings", index_params=index_params)
+            utility.wait_for_index_building_complete(collection_name, using=self.session.alias)
+            self._index_params[collection_name] = index_params
+            self.session.ensure_loaded(collection_name)
+        return index_params
+
+    def index_params(self, collection_name: str) -> dict:
+        """
+        Build params of the collection's embeddings index, read from Milvus once and cached.
+        """
+        if collection_name not in self._index_params:
+            self._index_params[collection_name] = _collection_index_params(self.get_collection(collection_name))
+        return self._index_params[collection_name]
+
+    def search_params(self, collection_name: str, preset: str = None, topk: int = 10) -> dict:
+        """
+        Search params for the collection's index at preset (its configured preset by default).
+        """
+        preset = preset or self.index_config.get(collection_name, {}).get("search_preset", self.search_preset)
+        index_params = self.index_params(collection_name)
+        if index_params is None:
+            return {"metric_type": DEFAULT_SEARCH_PARAMS["metric_type"], "params": dict(DEFAULT_SEARCH_PARAMS["params"])}
+        return preset_search_params(index_params, preset, topk)
+
+    def query(self, collection_name: str, query: str, k: int):
+        collection = self._loaded_collection(collection_name)
+        params = self._search_params(collection_name=collection_name, topk=k)
+        return self._call_loaded(collection_name, collection,
+                                 lambda collection: collection.search(query, "embeddings", params, limit=k))
 
     def load(self, collection_name: str):
-        collection = self.get_collection(collection_name)
-        collection.load()
+        self._loaded_collection(collection_name)
+
+    def release(self, collection_name: str):
+        self.get_collection(collection_name)
+        self.session.release(collection_name)
+
+    def warm_up(self, collection_names: List[str]):
+        params = {}
+        for collection_name in collection_names:
+            if self.session.has_collection(collection_name):
+                params[collection_name] = self.search_params(collection_name)
+        self.session.warm_up(collection_names, search_params=params)
 
     def delete(self, collection_name: str, expr: str):
         collection = self.get_collection(collection_name)
         collection.delete(expr)
 
     def list_collections(self):
-        if self.client:
-            res = self.client.list_collections()
-            print("List is ", res)
-            return res
-        return []
+        return self.session.list_collections()
 
     def drop_collection(self, collection_name: str):
-        utility.drop_collection(collection_name)
+        utility.drop_collection(collection_name, using=self.session.alias)
+        self.collections.pop(collection_name, None)
+        self._index_params.pop(collection_name, None)
+        self.session.forget(collection_name)
 
     def get_all_documents(self, collection_name: str, filter_condition: str = "", output_fields: List[str] = None):
         try:
-            collection = self.get_collection(collection_name)
             try:
-                collection.load()
+                collection = self._loaded_collection(collection_name)
             except CollectionNotExistException:
                 print(f"Collection '{collection_name}' does not exist.")
                 return []
@@ -139,7 +489,8 @@ class MilvusVectorDB:
             if output_fields is None or len(output_fields) == 0:
                 output_fields = [field.name for field in collection.schema.fields]
             
-            results = collection.query(expr=filter_condition, output_fields=output_fields, limit=100)
+            results = self._call_loaded(collection_name, collection, lambda collection: collection.query(
+                expr=filter_condition, output_fields=output_fields, limit=100))
             return results
         except MilvusException as e:
             print(f"Failed to retrieve documents from collection '{collection_name}': {e}")
@@ -159,29 +510,72 @@ class MilvusVectorDB:
             print(f"Failed to describe collection '{collection_name}': {e}")
             raise
    
-    def search(self, collection_name, description_embedding, params,expr="", output_fields=[],topk=10):
+    def _search_params(self, params: dict = None, collection_name: str = None, topk: int = 10) -> dict:
+        """
+        Merges per-call search params over the collection's preset (or the defaults). params may
+        carry "metric_type", "params" (e.g. nprobe, ef, or radius/range_filter for a range search)
+        and "preset" to pick another latency/recall preset for this call.
+        """
+        if collection_name is not None:
+            search_params = self.search_params(collection_name, (params or {}).get("preset"), topk)
+        else:
+            search_params = {"metric_type": DEFAULT_SEARCH_PARAMS["metric_type"],
+                             "params": dict(DEFAULT_SEARCH_PARAMS["params"])}
+        if params:
+            search_params["metric_type"] = params.get("metric_type", search_params["metric_type"])
+            search_params["params"].update(params.get("params", {}))
+        return search_params
+
+    def search(self, collection_name, description_embedding, params=None, expr="", output_fields=None, topk=10):
+        """
+        Searches with one query vector or a matrix of them in a single round-trip.
+        Returns the pymilvus SearchResult, one hit list per query vector.
+        """
         try:
-            collection = self.get_collection(collection_name)
             try:
-                collection.load()
+                collection = self._loaded_collection(collection_name)
             except CollectionNotExistException:
                 print(f"Collection '{collection_name}' does not exist.")
                 return []
             except ValueError as e:
                 print(e)
                 return []
+
+            data = np.asarray(description_embedding, dtype=np.float32)
+            if data.ndim == 1:
+                data = data[np.newaxis, :]
             
             search_param = {
-                "data": [description_embedding],
+                "data": data.tolist(),
                 "anns_field": "embeddings",
-                "param": {"metric_type": "L2", "params": {"nprobe": 10}},
-                "limit": 10,
-                "output_fields":output_fields,
-                "expr": "",
+                "param": self._search_params(params, collection_name, topk),
+                "limit": topk,
+                "output_fields": output_fields or [],
+                "expr": expr or None,
             }
             
-            results = collection.search(**search_param)
+            with metrics.span("search", backend="milvus", collection=collection_name) as span:
+                results = self._call_loaded(collection_name, collection,
+                                            lambda collection: collection.search(**search_param))
+                span.set(queries=len(data), topk=topk)
             return results
         except MilvusException as e:
             print(f"Failed to perform search on collection '{collection_name}': {e}")
             raise
+
+    def search_batch(self, collection_name, query_vectors, params=None, expr="", output_fields=None, topk=10):
+        """
+        Runs a batched search and returns one compact dict per query vector:
+            {"ids": [...], "distances": [...], "entities": [{field: value}, ...]}
+        """
+        results = self.search(collection_name, query_vectors, params=params, expr=expr,
+                              output_fields=output_fields, topk=topk)
+        output_fields = output_fields or []
+        batch = []
+        for hits in results:
+            batch.append({
+                "ids": list(hits.ids),
+                "distances": list(hits.distances),
+                "entities": [{field: hit.entity.get(field) for field in output_fields} for hit in hits],
+            })
+        return batch
@@ -1,5 +1,275 @@
-from vectordb.base import MYVectorDB
-from .faiss import FAISSVectorDB
-from .milvus import MilvusVectorDB
+import os
+import sys
+import subprocess
 
-print("All imports are working correctly in vectordb!")
\ No newline at end of file
+# Import-time budgets in milliseconds, measured with `python -X importtime`.
+# Override with IMPORT_BUDGET_<MODULE>_MS, e.g. IMPORT_BUDGET_VECTORDB_MS=200.
+IMPORT_BUDGETS_MS = {
+    "vectordb": 50,
+    "langchainhelper": 600,
+}
+
+# Heavy backends that importing the module must not pull in
+FORBIDDEN_IMPORTS = {
+    "vectordb": ["pymilvus", "faiss", "langchain_community"],
+    "langchainhelper": ["pymilvus", "faiss", "langchain_ollama", "langchain_community"],
+}
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure_import(module: str):
+    """
+    Imports module in a fresh interpreter and returns (cumulative import time in ms, imported module names).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    cumulative_us = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        imported.add(name.strip())
+        if name.strip() == module and not name.startswith("  "):
+            cumulative_us = int(cumulative)
+    return cumulative_us / 1000.0, imported
+
+def check_import_budgets():
+    failures = []
+    for module, budget_ms in IMPORT_BUDGETS_MS.items():
+        budget_ms = float(os.getenv(f"IMPORT_BUDGET_{module.upper()}_MS", budget_ms))
+        elapsed_ms, imported = measure_import(module)
+        top_level = {name.split(".")[0] for name in imported}
+        eager = [name for name in FORBIDDEN_IMPORTS[module] if name in top_level]
+        print(f"import {module}: {elapsed_ms:.1f} ms (budget {budget_ms:.0f} ms)")
+        if elapsed_ms > budget_ms:
+            failures.append(f"import {module} took {elapsed_ms:.1f} ms, budget is {budget_ms:.0f} ms")
+        if eager:
+            failures.append(f"import {module} eagerly imported {', '.join(eager)}")
+    return failures
+
+def use_repo_imports():
+    # Run as a script, this directory would shadow the faiss package with vectordb/faiss.py
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [REPO_ROOT] + [path for path in sys.path if os.path.abspath(path or ".") not in (here, REPO_ROOT)]
+
+def check_ivf_delete():
+    """
+    Deletes two videos from an IVF collection, then checks that searches still return the
+    right documents and that the collection can be rebuilt from its remaining vectors.
+    """
+    use_repo_imports()
+    import numpy as np
+    from langchain.schema import Document
+    import faiss
+    from vectordb.faiss import FAISSCollection
+
+    rows_per_video = 200
+    vectors = np.random.default_rng(0).standard_normal((12 * rows_per_video, 16)).astype(np.float32)
+    documents = [Document(page_content=str(i), metadata={"id": f"v{i // rows_per_video}"}) for i in range(len(vectors))]
+    collection = FAISSCollection(16, "IVF")
+    collection.add(vectors, documents)
+    collection.remove(["v3", "v7"])
+
+    failures = []
+    for stage in ("delete", "rebuild"):
+        faiss.extract_index_ivf(collection.index).nprobe = collection.nlist
+        for row in (0, 8 * rows_per_video + 5, 10 * rows_per_video + 1):
+            hits = collection.search(vectors[row:row + 1], 1)[0]
+            if not hits or hits[0][0].page_content != str(row):
+                failures.append(f"IVF search after {stage} returned {hits[:1]} for row {row}")
+        if stage == "delete":
+            try:
+                collection.rebuild("IVF")
+            except RuntimeError as e:
+                failures.append(f"IVF rebuild after delete failed: {e}")
+                break
+    print(f"IVF delete/rebuild: {len(failures)} failures")
+    return failures
+
+def check_near_duplicates():
+    """
+    Stores 50 chunks of ~170 words, then checks that copies with one, two or five words replaced
+    are caught as near-duplicates and that unrelated chunks are not.
+    """
+    use_repo_imports()
+    import random
+    import tempfile
+    from langchain.schema import Document
+    from dedup import DedupIndex
+
+    rng = random.Random(0)
+    vocabulary = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9)))
+                  for _ in range(3000)]
+    originals = [rng.choices(vocabulary, k=170) for _ in range(50)]
+
+    def document(words, video_id):
+        return Document(page_content=" ".join(words), metadata={"id": video_id})
+
+    failures = []
+    with tempfile.TemporaryDirectory() as path:
+        index = DedupIndex(path)
+        index.filter_documents([document(words, "original") for words in originals])
+        for edits in (1, 2, 5):
+            edited = []
+            for words in originals:
+                words = list(words)
+                for position in rng.sample(range(len(words)), edits):
+                    words[position] = rng.choice(vocabulary)
+                edited.append(document(words, f"edited{edits}"))
+            kept = len(index.filter_documents(edited))
+            if kept:
+                failures.append(f"{kept}/{len(edited)} chunks with {edits} edited words were not caught as near-duplicates")
+        unrelated = [document(rng.choices(vocabulary, k=170), "unrelated") for _ in range(50)]
+        kept = len(index.filter_documents(unrelated))
+        if kept != len(unrelated):
+            failures.append(f"{len(unrelated) - kept}/{len(unrelated)} unrelated chunks were dropped as duplicates")
+    print(f"Near-duplicate detection: {len(failures)} failures")
+    return failures
+
+def check_fetch_many():
+    """
+    Serves 24 pages from a local HTTP server on a thread, then checks that fetch_many() requests
+    each URL once, returns the pages in order, and never has more than per_host requests in flight.
+    """
+    use_repo_imports()
+    import time
+    import threading
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    from weburl import fetch_many
+
+    per_host = 3
+    hits = {}
+    in_flight = [0, 0]  # current, peak
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                hits[self.path] = hits.get(self.path, 0) + 1
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight[1], in_flight[0])
+            time.sleep(0.02)
+            body = f"<html><head><title>page{self.path}</title></head><body>text of {self.path}</body></html>".encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            with lock:
+                in_flight[0] -= 1
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}/{i}" for i in range(24)]
+    try:
+        pages = fetch_many(urls, max_workers=8, per_host=per_host)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    failures = []
+    repeated = {path: count for path, count in hits.items() if count != 1}
+    if len(hits) != len(urls) or repeated:
+        failures.append(f"fetch_many made {sum(hits.values())} requests for {len(urls)} URLs: {repeated}")
+    titles = [page.title if page else None for page in pages]
+    if titles != [f"page/{i}" for i in range(24)]:
+        failures.append(f"fetch_many returned pages out of order or missing: {titles}")
+    if in_flight[1] > per_host:
+        failures.append(f"fetch_many had {in_flight[1]} requests in flight to one host, limit is {per_host}")
+    print(f"fetch_many: {len(failures)} failures (peak {in_flight[1]} requests per host)")
+    return failures
+
+class _StubRequest:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+class _StubVideos:
+    """
+    Stands in for youtube_service.videos(): records each list() call and answers from fixed items.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def list(self, **kwargs):
+        self.calls.append(kwargs)
+        ids = kwargs["id"].split(",")
+        return _StubRequest({"items": [{
+            "id": video_id,
+            "snippet": {"title": f"Video {video_id}", "description": f"About {video_id}",
+                        "publishedAt": "2024-01-01T00:00:00Z"},
+            "statistics": {"viewCount": "10", "likeCount": "2", "commentCount": "1"},
+        } for video_id in ids]})
+
+class _StubYoutubeService:
+    def __init__(self):
+        self.videos_resource = _StubVideos()
+
+    def videos(self):
+        return self.videos_resource
+
+def check_youtube_batching():
+    """
+    Fetches 120 ids from a stubbed YouTube Data API service, then checks that it took 3
+    videos().list calls and 3 quota units, and that the dicts match what save_metadata_to_file writes.
+    """
+    use_repo_imports()
+    import json
+    import tempfile
+    try:
+        import youtube
+    except ImportError as e:
+        print(f"YouTube batching: skipped ({e})")
+        return []
+
+    service = _StubYoutubeService()
+    video_ids = [f"vid{i:03d}" for i in range(120)]
+    quota = youtube.QuotaCounter()
+    batch = youtube.fetch_videos_metadata(service, video_ids, quota)
+
+    failures = []
+    calls = service.videos_resource.calls
+    if len(calls) != 3 or any("maxResults" in call for call in calls):
+        failures.append(f"120 ids took {len(calls)} videos().list calls ({calls[:1]}), expected 3 without maxResults")
+    if quota.units != 3 or quota.by_method != {"videos.list": 3}:
+        failures.append(f"quota counted {quota.units} units {quota.by_method}, expected 3 videos.list units")
+    if [metadata["id"] for metadata in batch] != video_ids:
+        failures.append("fetch_videos_metadata did not return one dict per id in order")
+
+    # One video fetched on its own and written to disk must match its batched dict
+    get_service = youtube.get_youtube_service
+    youtube.get_youtube_service = lambda api_key: service
+    try:
+        video = youtube.Youtube("stub-key", "https://www.youtube.com/watch?v=vid007")
+        with tempfile.TemporaryDirectory() as directory:
+            meta_path = os.path.join(directory, "META_vid007.json")
+            video.save_metadata_to_file(meta_path)
+            with open(meta_path) as file:
+                saved = json.load(file)
+    finally:
+        youtube.get_youtube_service = get_service
+    if saved != batch[7]:
+        failures.append(f"batched metadata {batch[7]} differs from the saved file {saved}")
+    print(f"YouTube batching: {len(failures)} failures")
+    return failures
+
+if __name__ == "__main__":
+    failures = (check_import_budgets() + check_ivf_delete() + check_near_duplicates() + check_fetch_many()
+                + check_youtube_batching())
+    for failure in failures:
+        print("FAIL:", failure)
+    if failures:
+        sys.exit(1)
+    print("All vectordb checks passed!")
@@ -0,0 +1,213 @@
+import time
+import queue
+import threading
+import numpy as np
+import metrics
+
+DEFAULT_MAX_ROWS = 5000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_AGE = 5.0
+DEFAULT_MAX_PENDING = 4
+
+_STOP = object()
+
+def estimate_bytes(entities: dict) -> int:
+    """
+    Rough payload size of a column batch: vectors as float32, strings by length, scalars as 8 bytes.
+    """
+    total = 0
+    for values in entities.values():
+        if not len(values):
+            continue
+        first = values[0]
+        if isinstance(first, np.ndarray):
+            total += first.nbytes * len(values)
+        elif isinstance(first, (list, tuple)):
+            total += 4 * len(first) * len(values)
+        elif isinstance(first, str):
+            total += sum(len(value) for value in values)
+        else:
+            total += 8 * len(values)
+    return total
+
+class _Buffer:
+    __slots__ = ("columns", "rows", "bytes", "since")
+
+    def __init__(self, fields):
+        self.columns = {field: [] for field in fields}
+        self.rows = 0
+        self.bytes = 0
+        self.since = time.monotonic()
+
+class BufferedWriter:
+    """
+    Write-behind inserter for MilvusVectorDB (or any db with insert(name, entities, flush) and flush(name)).
+
+    Column batches from many small write() calls are concatenated per collection and handed to a
+    background thread once a collection holds max_rows rows or max_bytes bytes, or its oldest row
+    is max_age seconds old. Rows are inserted without flushing; close() pushes what is left and
+    flushes each collection once, so a backfill seals a few large segments instead of one per file.
+
+    At most max_pending batches wait for the inserter; beyond that write() blocks (backpressure),
+    which keeps memory bounded when Milvus is slower than the embedder. Use it as a context manager
+    to guarantee the final flush. insert()/flush() mirror MilvusVectorDB, so a writer can be passed
+    wherever a milvus_db is expected; their flush requests are deferred to close().
+
+    when_inserted() registers a callback for when every row written so far has been inserted,
+    so callers can checkpoint progress before close().
+    """
+
+    def __init__(self, db, max_rows: int = DEFAULT_MAX_ROWS, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE, max_pending: int = DEFAULT_MAX_PENDING):
+        self.db = db
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.stats = {"rows_written": 0, "rows_inserted": 0, "bytes_inserted": 0, "inserts": 0,
+                      "flushes": 0, "blocked_seconds": 0.0}
+        self._buffers = {}
+        self._touched = []
+        self._written = {}  # rows written / inserted per collection, for when_inserted()
+        self._inserted = {}
+        self._waiting = []  # (rows per collection to wait for, callback)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def write(self, collection_name: str, entities: dict):
+        """
+        Buffers a column batch ({field: [values]}, the layout MilvusVectorDB.insert takes).
+        """
+        self._raise_error()
+        if self._closed:
+            raise ValueError("BufferedWriter is closed")
+        rows = len(next(iter(entities.values()), []))
+        if not rows:
+            return
+        size = estimate_bytes(entities)
+        with self._lock:
+            buffer = self._buffers.get(collection_name)
+            if buffer is None:
+                buffer = self._buffers[collection_name] = _Buffer(entities)
+                if collection_name not in self._touched:
+                    self._touched.append(collection_name)
+            for field, values in entities.items():
+                buffer.columns[field].extend(values)
+            buffer.rows += rows
+            buffer.bytes += size
+            self._written[collection_name] = self._written.get(collection_name, 0) + rows
+            self.stats["rows_written"] += rows
+            full = buffer.rows >= self.max_rows or buffer.bytes >= self.max_bytes
+            batch = self._buffers.pop(collection_name) if full else None
+        if batch is not None:
+            self._submit(collection_name, batch)
+
+    def insert(self, collection_name: str, entities: dict, flush: bool = False):
+        self.write(collection_name, entities)
+
+    def flush(self, collection_name: str = None):
+        # Sealing is deferred to close(); flushing per call would recreate the tiny segments
+        self._raise_error()
+
+    def when_inserted(self, callback):
+        """
+        Calls callback() once every row written so far has been inserted (not yet flushed). It runs on
+        the inserter thread, or right away when nothing is pending; it is never called for rows that
+        failed to insert.
+        """
+        with self._lock:
+            targets = {name: rows for name, rows in self._written.items() if rows > self._inserted.get(name, 0)}
+            if targets:
+                self._waiting.append((targets, callback))
+                return
+        callback()
+
+    def _submit(self, collection_name: str, batch: _Buffer):
+        started = time.perf_counter()
+        self._queue.put((collection_name, batch))
+        waited = time.perf_counter() - started
+        if waited > 0.001:
+            with self._lock:
+                self.stats["blocked_seconds"] += waited
+            metrics.observe("writer_backpressure", waited)
+
+    def _take_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [name for name, buffer in self._buffers.items() if now - buffer.since >= self.max_age]
+            return [(name, self._buffers.pop(name)) for name in expired]
+
+    def _run(self):
+        tick = max(0.05, min(self.max_age / 2, 1.0))
+        while True:
+            try:
+                item = self._queue.get(timeout=tick)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                return
+            if item is not None:
+                self._insert(*item)
+            for collection_name, batch in self._take_expired():
+                self._insert(collection_name, batch)
+
+    def _insert(self, collection_name: str, batch: _Buffer):
+        if self._error is not None:
+            return  # rows after a failed insert are dropped; close() raises the error
+        try:
+            self.db.insert(collection_name, batch.columns, flush=False)
+        except Exception as e:
+            print(f"Failed to insert {batch.rows} buffered rows into '{collection_name}': {e}")
+            self._error = e
+            return
+        with self._lock:
+            self.stats["rows_inserted"] += batch.rows
+            self.stats["bytes_inserted"] += batch.bytes
+            self.stats["inserts"] += 1
+            self._inserted[collection_name] = self._inserted.get(collection_name, 0) + batch.rows
+            ready = [item for item in self._waiting
+                     if all(self._inserted.get(name, 0) >= rows for name, rows in item[0].items())]
+            self._waiting = [item for item in self._waiting if item not in ready]
+        metrics.incr("writer_inserts", collection=collection_name)
+        metrics.incr("writer_rows", batch.rows, collection=collection_name)
+        for _, callback in ready:
+            try:
+                callback()
+            except Exception as e:
+                print(f"when_inserted callback failed: {e}")
+                self._error = e
+
+    def close(self):
+        """
+        Inserts everything still buffered, waits for the inserter, then flushes each collection once.
+        """
+        if self._closed:
+            self._raise_error()
+            return
+        self._closed = True
+        with self._lock:
+            remaining = list(self._buffers.items())
+            self._buffers.clear()
+        for collection_name, batch in remaining:
+            self._queue.put((collection_name, batch))
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._raise_error()
+        for collection_name in self._touched:
+            self.db.flush(collection_name)
+            self.stats["flushes"] += 1
+        metrics.incr("writer_flushes", len(self._touched))
@@ -1,13 +1,70 @@
 from dotenv import load_dotenv
 import os
 import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import json
+import metrics
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_PER_HOST = 4
+
+_sessions = {}  # pool_maxsize -> session
+_session_lock = threading.Lock()
+
+def get_session(pool_maxsize: int = DEFAULT_MAX_WORKERS) -> requests.Session:
+    """
+    Returns the process-wide session with pool_maxsize connections per host, so requests reuse
+    keep-alive connections. Each pool size gets its own session, so fetch_many() with more
+    workers than the first caller used does not wait on a smaller pool.
+    """
+    with _session_lock:
+        if pool_maxsize not in _sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[pool_maxsize] = session
+        return _sessions[pool_maxsize]
+
+def parse_webpage(url: str, content: bytes):
+    """
+    Parses the page once and returns (metadata, text).
+    """
+    soup = BeautifulSoup(content, 'html.parser')
+
+    title = soup.find('title').text if soup.find('title') else 'No title'
+    description = soup.find('meta', attrs={'name': 'description'})
+    description = description['content'] if description else 'No description'
+
+    metadata = {
+        "id": url,  # Ensure id and uri are the same
+        "uri": url,
+        "source_type": "web",
+        "title": title,
+        "description": description,
+        "publish_date": "",  # Default to empty string
+        "view_count": 0,     # Default to zero
+        "like_count": 0,     # Default to zero
+        "dislike_count": 0,  # Default to zero
+        "comment_count": 0   # Default to zero
+    }
+    return metadata, soup.get_text()
 
 class WebURL:
-    def __init__(self, url: str):
+    def __init__(self, url: str, content: bytes = None, session: requests.Session = None, timeout: float = DEFAULT_TIMEOUT):
         self.url = url
-        self.metadata = self.get_webpage_metadata(url)
+        self.session = session
+        self.timeout = timeout
+        self.text = None
+        if content is None:
+            self.metadata = self.get_webpage_metadata(url)
+        else:
+            self.metadata, self.text = self._parse(content)
         
         if not self.metadata:
             self.title = None
@@ -26,46 +83,43 @@ class WebURL:
             self.dislike_count = self.metadata.get("dislike_count", 0)
             self.comment_count = self.metadata.get("comment_count", 0)
 
+    def fetch(self, url: str) -> bytes:
+        session = self.session or get_session()
+        with metrics.span("fetch", source="web"):
+            response = session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        metrics.incr("bytes", len(response.content), stage="fetch")
+        return response.content
+
+    def _parse(self, content: bytes):
+        try:
+            with metrics.span("parse", source="web"):
+                return parse_webpage(self.url, content)
+        except Exception as e:
+            print(f"An error occurred while parsing the webpage: {e}")
+            return None, ""
+
     def get_webpage_metadata(self, url: str) -> dict:
         """
-        Fetches metadata for the webpage.
+        Fetches the webpage once and keeps both its metadata and its text.
         """
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            title = soup.find('title').text if soup.find('title') else 'No title'
-            description = soup.find('meta', attrs={'name': 'description'})
-            description = description['content'] if description else 'No description'
-            
-            metadata = {
-                "id": url,  # Ensure id and uri are the same
-                "uri": url,
-                "source_type": "web",
-                "title": title,
-                "description": description,
-                "publish_date": "",  # Default to empty string
-                "view_count": 0,     # Default to zero
-                "like_count": 0,     # Default to zero
-                "dislike_count": 0,  # Default to zero
-                "comment_count": 0   # Default to zero
-            }
-            return metadata
+            content = self.fetch(url)
         except Exception as e:
             print(f"An error occurred while fetching webpage metadata: {e}")
             return None
+        metadata, self.text = self._parse(content)
+        return metadata
 
     def download_webpage_transcript(self) -> str:
         """
-        Downloads the transcript for the webpage.
+        Returns the transcript for the webpage, fetching it only if the page was not fetched yet.
         """
+        if self.text is not None:
+            return self.text
         try:
-            response = requests.get(self.url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            transcript = soup.get_text()
-            return transcript
+            _, self.text = self._parse(self.fetch(self.url))
+            return self.text
         except Exception as e:
             print(f"An error occurred while downloading the webpage transcript: {e}")
             return ""
@@ -95,6 +149,42 @@ class WebURL:
         else:
             print("No transcript to save.")
 
+def fetch_many(urls, max_workers: int = DEFAULT_MAX_WORKERS, per_host: int = DEFAULT_PER_HOST,
+               timeout: float = DEFAULT_TIMEOUT, session: requests.Session = None):
+    """
+    Fetches many URLs concurrently over pooled keep-alive connections, at most per_host
+    requests at a time to the same host. Returns WebURL objects in the order of urls,
+    with None in place of pages that failed to download.
+    """
+    session = session or get_session(max_workers)
+    host_limits = {}
+    host_lock = threading.Lock()
+
+    def host_semaphore(url):
+        host = urlparse(url).netloc
+        with host_lock:
+            if host not in host_limits:
+                host_limits[host] = threading.BoundedSemaphore(per_host)
+            return host_limits[host]
+
+    def fetch_one(url):
+        with host_semaphore(url):
+            try:
+                with metrics.span("fetch", source="web"):
+                    response = session.get(url, timeout=timeout)
+                    response.raise_for_status()
+                content = response.content
+                metrics.incr("bytes", len(content), stage="fetch")
+            except Exception as e:
+                print(f"An error occurred while fetching {url}: {e}")
+                content = None
+        if content is None:
+            return None
+        return WebURL(url, content=content, session=session, timeout=timeout)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(fetch_one, urls))
+
 def main():
     load_dotenv()
     url = "https://finance.yahoo.com/news/live/stock-market-today-dow-pops-nasdaq-slips-as-focus-turns-to-cpi-inflation-report-210216764.html"  # Replace with the actual URL
@@ -1,24 +1,170 @@
 import os
 import json
+import threading
 from typing import List, Tuple
+from urllib.parse import urlparse, parse_qs
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from dotenv import load_dotenv
 from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled
+from segments import SegmentIndex, segment_index_path, load_segment_index, deep_link
+import metrics
 
 load_dotenv()
 
+# videos().list and playlistItems().list accept at most 50 ids/results per request
+MAX_RESULTS_PER_REQUEST = 50
+
+# YouTube Data API v3 quota cost of each list call
+QUOTA_COSTS = {
+    "videos.list": 1,
+    "playlistItems.list": 1,
+    "channels.list": 1,
+}
+
+# One client per thread: a client's httplib2 connection is not thread-safe
+_services = threading.local()
+
+def get_youtube_service(api_key: str):
+    """
+    Returns this thread's YouTube Data API client for api_key, building it on first use.
+    build() loads and parses the discovery document, so it is done once per key and thread.
+    """
+    services = getattr(_services, "by_key", None)
+    if services is None:
+        services = _services.by_key = {}
+    if api_key not in services:
+        services[api_key] = build('youtube', 'v3', developerKey=api_key)
+    return services[api_key]
+
+def extract_video_id(youtube_url: str) -> str:
+    """
+    Extracts the video ID from watch, youtu.be, shorts and embed URLs.
+    """
+    parsed = urlparse(youtube_url)
+    if parsed.hostname and parsed.hostname.endswith("youtu.be"):
+        return parsed.path.lstrip("/").split("/")[0]
+    query = parse_qs(parsed.query)
+    if "v" in query:
+        return query["v"][0]
+    parts = [part for part in parsed.path.split("/") if part]
+    if len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+        return parts[1]
+    return youtube_url.split("v=")[1]
+
+class QuotaCounter:
+    """
+    Counts API calls and the quota units they used.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.units = 0
+        self.by_method = {}
+
+    def add(self, method: str):
+        self.calls += 1
+        self.units += QUOTA_COSTS.get(method, 1)
+        self.by_method[method] = self.by_method.get(method, 0) + 1
+        metrics.incr("youtube_quota_units", QUOTA_COSTS.get(method, 1), method=method)
+
+def build_video_metadata(video_info: dict) -> dict:
+    """
+    Builds the metadata dict written by save_metadata_to_file from a videos().list item.
+    """
+    snippet = video_info["snippet"]
+    statistics = video_info["statistics"]
+
+    return {
+        "id": video_info["id"],
+        "source_type": "youtube",
+        "title": snippet.get("title"),
+        "description": snippet.get("description"),
+        "publish_date": snippet.get("publishedAt"),
+        "view_count": int(statistics.get("viewCount", 0)),
+        "like_count": int(statistics.get("likeCount", 0)),
+        "dislike_count": int(statistics.get("dislikeCount", 0)),
+        "comment_count": int(statistics.get("commentCount", 0))
+    }
+
+def fetch_videos_metadata(youtube_service, video_ids: List[str], quota: QuotaCounter = None) -> List[dict]:
+    """
+    Fetches metadata for many videos with one videos().list call per 50 ids.
+    Returns metadata dicts in the order of video_ids, skipping videos the API did not return.
+    """
+    quota = quota or QuotaCounter()
+    by_id = {}
+    for start in range(0, len(video_ids), MAX_RESULTS_PER_REQUEST):
+        chunk = video_ids[start:start + MAX_RESULTS_PER_REQUEST]
+        with metrics.span("fetch", source="youtube_api"):
+            response = youtube_service.videos().list(
+                part="snippet,statistics",
+                id=",".join(chunk)
+            ).execute()
+        quota.add("videos.list")
+        for video_info in response.get("items", []):
+            by_id[video_info["id"]] = build_video_metadata(video_info)
+    return [by_id[video_id] for video_id in video_ids if video_id in by_id]
+
+def list_playlist_video_ids(youtube_service, playlist_id: str, quota: QuotaCounter = None) -> List[str]:
+    """
+    Lists the video ids of a playlist, 50 per page.
+    """
+    quota = quota or QuotaCounter()
+    video_ids = []
+    page_token = None
+    while True:
+        response = youtube_service.playlistItems().list(
+            part="contentDetails",
+            playlistId=playlist_id,
+            maxResults=MAX_RESULTS_PER_REQUEST,
+            pageToken=page_token
+        ).execute()
+        quota.add("playlistItems.list")
+        video_ids.extend(item["contentDetails"]["videoId"] for item in response.get("items", []))
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return video_ids
+
+def get_channel_uploads_playlist(youtube_service, channel_id: str, quota: QuotaCounter = None) -> str:
+    """
+    Returns the id of the playlist holding every upload of a channel.
+    """
+    quota = quota or QuotaCounter()
+    response = youtube_service.channels().list(part="contentDetails", id=channel_id).execute()
+    quota.add("channels.list")
+    if not response.get("items"):
+        return None
+    return response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+
+def fetch_playlist_metadata(youtube_service, playlist_id: str, quota: QuotaCounter = None) -> List[dict]:
+    quota = quota or QuotaCounter()
+    video_ids = list_playlist_video_ids(youtube_service, playlist_id, quota)
+    return fetch_videos_metadata(youtube_service, video_ids, quota)
+
+def fetch_channel_metadata(youtube_service, channel_id: str, quota: QuotaCounter = None) -> List[dict]:
+    """
+    Fetches metadata for every upload of a channel: one channels().list call, then one
+    playlistItems().list and one videos().list call per 50 videos.
+    """
+    quota = quota or QuotaCounter()
+    uploads = get_channel_uploads_playlist(youtube_service, channel_id, quota)
+    if uploads is None:
+        return []
+    return fetch_playlist_metadata(youtube_service, uploads, quota)
+
 class Youtube:
 
-    def __init__(self, api_key: str, youtube_url: str):
+    def __init__(self, api_key: str, youtube_url: str, metadata: dict = None):
         """
         Initializes the Youtube class with API key and YouTube URL.
+        Pass metadata to skip the videos().list call, e.g. when it came from a batch fetch.
         """
         self.api_key = api_key
-        self.youtube = build('youtube', 'v3', developerKey=api_key)
         self.youtube_url = youtube_url
         self.youtube_id = self.extract_video_id(youtube_url)
-        self.metadata = self.get_video_metadata()
+        self.segments = None
+        self.metadata = metadata if metadata is not None else self.get_video_metadata()
         
         if not self.metadata:
             self.title = None
@@ -37,6 +183,10 @@ class Youtube:
             self.dislike_count = self.metadata.get("dislike_count")
             self.comment_count = self.metadata.get("comment_count")
 
+    @property
+    def youtube(self):
+        return get_youtube_service(self.api_key)
+
     def get_video_metadata(self) -> dict:
         """
         Fetches metadata for the YouTube video.
@@ -47,26 +197,12 @@ class Youtube:
                 part="snippet,statistics",
                 id=video_id
             )
-            response = request.execute()
+            with metrics.span("fetch", source="youtube_api"):
+                response = request.execute()
             if not response["items"]:
                 return None
 
-            video_info = response["items"][0]
-            snippet = video_info["snippet"]
-            statistics = video_info["statistics"]
-
-            metadata = {
-                "id": video_id,
-                "source_type": "youtube",
-                "title": snippet.get("title"),
-                "description": snippet.get("description"),
-                "publish_date": snippet.get("publishedAt"),
-                "view_count": int(statistics.get("viewCount", 0)),
-                "like_count": int(statistics.get("likeCount", 0)),
-                "dislike_count": int(statistics.get("dislikeCount", 0)),
-                "comment_count": int(statistics.get("commentCount", 0))
-            }
-            return metadata
+            return build_video_metadata(response["items"][0])
         except Exception as e:
             print(f"An error occurred while fetching video metadata: {e}")
             return None
@@ -76,10 +212,15 @@ class Youtube:
         Downloads the transcript for the YouTube video using youtube_transcript_api.
         """
         try:
-            transcript_list = YouTubeTranscriptApi.list_transcripts(self.youtube_id)
-            transcript = transcript_list.find_transcript(['en'])
-            transcript_pieces = transcript.fetch()
-            transcript_text = ' '.join([piece['text'] for piece in transcript_pieces])
+            with metrics.span("fetch", source="youtube_transcript"):
+                transcript_list = YouTubeTranscriptApi.list_transcripts(self.youtube_id)
+                transcript = transcript_list.find_transcript(['en'])
+                transcript_pieces = transcript.fetch()
+            # Keep each piece's start and duration so chunks can be mapped back to video time
+            with metrics.span("parse", source="youtube_transcript"):
+                transcript_text, self.segments = SegmentIndex.from_pieces(transcript_pieces)
+            if metrics.is_enabled():
+                metrics.incr("bytes", len(transcript_text.encode("utf-8")), stage="fetch")
             return transcript_text
         except (NoTranscriptFound, TranscriptsDisabled) as e:
             print(f"An error occurred while fetching the YouTube transcript: {e}")
@@ -107,6 +248,8 @@ class Youtube:
             with open(file_path, "w") as file:
                 file.write(transcript)
             print(f"Transcript saved to: {file_path}")
+            if self.segments is not None:
+                self.segments.save(segment_index_path(file_path))
             
             self.save_metadata_to_file(meta_file_path)
         else:
@@ -124,12 +267,28 @@ class Youtube:
             json.dump(self.metadata, meta_file, indent=4)
         print(f"Metadata saved to: {meta_file_path}")
 
+    @classmethod
+    def from_video_ids(cls, api_key: str, video_ids: List[str], quota: QuotaCounter = None) -> List["Youtube"]:
+        """
+        Builds Youtube objects for many videos with batched metadata requests.
+        """
+        youtube_service = get_youtube_service(api_key)
+        return [cls(api_key, f"https://www.youtube.com/watch?v={metadata['id']}", metadata=metadata)
+                for metadata in fetch_videos_metadata(youtube_service, video_ids, quota)]
+
+    def deep_link(self, char_offset: int) -> str:
+        """
+        Returns a link to the point in the video where transcript char_offset is spoken.
+        """
+        segments = self.segments or load_segment_index(os.path.join("transcripts", f"{self.title}.txt"))
+        seconds = segments.char_to_time(char_offset) if segments else 0
+        return deep_link(self.youtube_id, seconds)
+
     def extract_video_id(self, youtube_url: str) -> str:
         """
         Extracts the video ID from the YouTube URL.
         """
-        video_id = youtube_url.split("v=")[1]
-        return video_id
+        return extract_video_id(youtube_url)
 
 def main():
     api_key = os.getenv("YOUTUBE_API_KEY")